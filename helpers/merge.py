@@ -5,44 +5,95 @@
 # --------------------------------------------------------
 
 from argparse import ArgumentParser
+from ROOT import TChain, RDataFrame
 from src.run import Run, loads, join, info, PBar, TFile, zeros
 from src.analysis import Analysis
+from helpers.utils import remove_file, time
+from tempfile import gettempdir
 
-parser = ArgumentParser()
-parser.add_argument('runs', help='list of runs: [112,113]')
-parser.add_argument('-tc', nargs='?', default=None, help='Beam Test')
-args = parser.parse_args()
-
-tc = Analysis.find_testcampaign(args.tc)
-runs = [Run(run_nr, tc, verbose=False) for run_nr in loads(args.runs)]
-trees = [run.Tree for run in runs]
-run = runs[0]
-
-
-# NewFile = TFile(root_files[0].GetName(), 'RECREATE')
-new_file = TFile(join(run.RootFileDir, f'merged-{"-".join(str(r.Number) for r in runs)}.root'), 'RECREATE')
-
-info('cloning tree...')
-new_tree = trees[0].CloneTree()
-new_tree.ResetBranchAddresses()
-event_number = zeros(1, dtype='i')
-
-at_entry = run.NEvents
-
-pbar = PBar(sum(r.NEvents for r in runs[1:]))
-for tree in trees[1:]:
-    new_tree.SetBranchAddress('event_number', event_number)
-    new_tree.CopyAddresses(tree)
-    for ev in tree:
-        event_number[0] = at_entry
-        at_entry += 1
-        new_tree.Fill()
-        pbar.update()
-    tree.ResetBranchAddresses()
-
-new_file.cd()
-new_tree.Write()
-macro = run.RootFile.Get('region_information')
-if macro:
-    macro.Write()
-new_file.Write()
+
+def merge_loop(trees, file_name):
+    """ copy the events of the following trees one by one and renumber them. """
+    new_file = TFile(file_name, 'RECREATE')
+    info('cloning tree...')
+    new_tree = trees[0].CloneTree()
+    new_tree.ResetBranchAddresses()
+    event_number = zeros(1, dtype='i')
+
+    at_entry = trees[0].GetEntries()
+
+    pbar = PBar(sum(t.GetEntries() for t in trees[1:]))
+    for tree in trees[1:]:
+        new_tree.SetBranchAddress('event_number', event_number)
+        new_tree.CopyAddresses(tree)
+        for ev in tree:
+            event_number[0] = at_entry
+            at_entry += 1
+            new_tree.Fill()
+            pbar.update()
+        tree.ResetBranchAddresses()
+
+    new_file.cd()
+    new_tree.Write()
+    return new_file
+
+
+def merge_bulk(trees, file_name):
+    """ copy all branches of the chained trees in a single snapshot with the same branch list and only renumber the events of the following trees. """
+    info('merging trees...')
+    chain = TChain(trees[0].GetName())
+    for tree in trees:
+        chain.Add(tree.GetCurrentFile().GetName())
+    branches = [b.GetName() for b in trees[0].GetListOfBranches()]
+    df = RDataFrame(chain).Redefine('event_number', f'rdfentry_ < {trees[0].GetEntries()} ? event_number : int(rdfentry_)')  # same numbering as merge_loop
+    df.Snapshot(trees[0].GetName(), file_name, branches)
+    return TFile(file_name, 'UPDATE')
+
+
+def merge(trees, file_name, loop=False):
+    return (merge_loop if loop else merge_bulk)(trees, file_name)
+
+
+def make_test_tree(file_name, n=1e6, tree_name='tree'):
+    RDataFrame(int(n)).Define('event_number', 'int(rdfentry_)').Define('signal', 'gRandom->Landau(80, 8)').Define('n_hits', 'gRandom->Poisson(4)')\
+        .Define('peaks', 'ROOT::RVec<float> v(4); for (auto & x: v) x = gRandom->Uniform(1024); return v;').Snapshot(tree_name, file_name)
+    f = TFile(file_name)
+    return f, f.Get(tree_name)
+
+
+def benchmark(n=1e6):
+    """ merge two synthetic trees with [n] events with both methods. """
+    d = gettempdir()
+    files, trees = zip(*[make_test_tree(join(d, f'merge-test-{i}.root'), n) for i in range(2)])
+    for loop in [True, False]:
+        t0 = time()
+        merge(trees, join(d, 'merge-test.root'), loop).Close()
+        info(f'{"loop" if loop else "bulk"} merge of {2 * n:.0e} events: {time() - t0:.2f} s')
+    for f in files:
+        f.Close()
+        remove_file(f.GetName())
+    remove_file(join(d, 'merge-test.root'))
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser()
+    parser.add_argument('runs', nargs='?', default=None, help='list of runs: [112,113]')
+    parser.add_argument('-tc', nargs='?', default=None, help='Beam Test')
+    parser.add_argument('-loop', action='store_true', help='copy the events one by one')
+    parser.add_argument('-bench', action='store_true', help='compare the merge methods for two synthetic trees')
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark()
+    else:
+        tc = Analysis.find_testcampaign(args.tc)
+        runs = [Run(run_nr, tc, verbose=False) for run_nr in loads(args.runs)]
+        run = runs[0]
+
+        new_file = merge([r.Tree for r in runs], join(run.RootFileDir, f'merged-{"-".join(str(r.Number) for r in runs)}.root'), args.loop)
+        macro = run.RootFile.Get('region_information')
+        if macro:
+            new_file.cd()
+            macro.Write()
+        new_file.Write()
@@ -6,7 +6,7 @@ from src.binning import Bins
 from os import chdir, system
 from plotting.draw import *
 from helpers.utils import *
-from numpy import genfromtxt, polyfit, polyval, quantile, delete, all
+from numpy import genfromtxt, polyfit, polyval, quantile, delete, all, bincount
 from pathlib import Path
 
 plot = Draw()
@@ -43,22 +43,41 @@ def draw_chi2(m='x', dut=1):
     plot.distribution(x[x > -900], title=f'Chi2 in {m.title()}', x_tit=f'#chi^{{2}} {m.title()}')
 
 
-def trig_edges(nwf=None):
+def trig_edges(nwf=None, vec=False, chunk=1e4):
     nwf = entries if nwf is None else nwf
-    pbar = PBar(nwf)
     h = TH1F('h_te', 'Trigger Edges', 1024, 0, 1024)
-    t.Draw('wf8', '', 'goff', nwf, 0)
-    buf = t.GetV1()
-    for i in range(nwf):
-        pbar.update(i + 1)
-        for k in range(1023):
-            # print i * 1204 + j, int(buf[i * 1204 + j])
-            if abs(buf[i * 1024 + k] - buf[i * 1024 + k + 1]) > 50:
-                h.Fill(k)
+    if vec:
+        n = sum(bincount(find_trig_edges(wf), minlength=1023) for wf in get_wf_chunks(nwf, chunk))
+        for k, ik in enumerate(n):
+            h.SetBinContent(k + 1, ik)
+        h.SetEntries(n.sum())
+    else:
+        pbar = PBar(nwf)
+        t.Draw('wf8', '', 'goff', nwf, 0)
+        buf = t.GetV1()
+        for i in range(nwf):
+            pbar.update(i + 1)
+            for k in range(1023):
+                # print i * 1204 + j, int(buf[i * 1204 + j])
+                if abs(buf[i * 1024 + k] - buf[i * 1024 + k + 1]) > 50:
+                    h.Fill(k)
     format_histo(h, x_tit='Bin Number', y_tit='Number of Entries', y_off=1.4, stats=0, fill_color=407)
     plot.histo(h, lm=.12)
 
 
+def find_trig_edges(wf, thresh=50, first=False):
+    """ :returns: sample numbers k with |wf[k] - wf[k + 1]| > [thresh] for waveforms with shape (n_events, n_samples). If [first] only the first edge of every event, -1 if there is none. """
+    edges = abs(diff(wf, axis=1)) > thresh
+    return where(edges.any(axis=1), edges.argmax(axis=1), -1) if first else where(edges)[1]
+
+
+def get_wf_chunks(nwf=None, chunk=1e4, ch=8, n_samples=1024):
+    """ yield the waveforms of channel [ch] in blocks of [chunk] events, so that the whole run does not have to be in memory. """
+    nwf, chunk = int(choose(nwf, entries)), int(chunk)
+    for i in range(0, nwf, chunk):
+        yield get_tree_vec(t, f'wf{ch}', nentries=min(chunk, nwf - i), firstentry=i).reshape(-1, n_samples)
+
+
 def draw_waveforms(n=1000, start_event=0, cut_string='', show=True, fixed_range=None, ch=0):
     channel = ch
     global count
@@ -7,28 +7,36 @@ ROOT.PyConfig.IgnoreCommandLineOptions = True
 from ROOT import TF1, TSpectrum, TTree
 
 import pickle
+from tempfile import gettempdir
+import sqlite3
 from collections import OrderedDict
 from copy import deepcopy
 from datetime import datetime, timedelta
 from multiprocessing import Pool, cpu_count
+from multiprocessing.shared_memory import SharedMemory
 from subprocess import call
-from threading import Thread
+from fcntl import flock, LOCK_EX, LOCK_UN
+from threading import Thread, Lock
 from time import time, sleep
 
 from gtts import gTTS
 from numpy import sqrt, array, mean, arange, log10, concatenate, where, count_nonzero, full, ndarray, exp, sin, cos, arctan, zeros, dot, roll, arctan2, frombuffer, split, cumsum
-from numpy import histogram, log2, diff, isfinite, pi, corrcoef, quantile, column_stack
+from numpy import histogram, log2, diff, isfinite, pi, corrcoef, quantile, column_stack, log, tan, polyval, select, errstate, asarray, broadcast, diag, prod, dtype as dtype_, iinfo, unique, allclose, rint
+from numpy import searchsorted, bincount, ones, argsort, minimum, maximum, interp, inf, nan, linspace, nanmedian, atleast_2d, empty
+from numpy.random import default_rng
 from os import makedirs, remove, devnull, stat, getenv, _exit
 from os import path as pth
 from os.path import dirname, realpath, join
 from pytz import timezone, utc
 from termcolor import colored
 from uncertainties import ufloat, ufloat_fromstr
+from uncertainties.core import AffineScalarFunc
 from argparse import ArgumentParser
 from progressbar import Bar, ETA, FileTransferSpeed, Percentage, ProgressBar, SimpleProgress, Widget
 from configparser import ConfigParser, NoSectionError, NoOptionError
 from scipy.optimize import curve_fit
 from scipy import constants
+from scipy.special import erf
 import h5py
 from functools import partial, wraps
 from queue import Queue
@@ -493,8 +501,8 @@ def get_time_vec(sel, run=None):
         return
     if tree is None:
         return
-    tree.SetEstimate(-1)
-    tvec = get_tree_vec(tree, 'time')
+    tvec = concatenate(list(iter_tree_vec(tree, 'time')))
+    tree.SetEstimate(-1)  # the following queries expect a buffer for the whole tree
     fill_empty_time_entries(tvec)
     time_vec = correct_time(tvec, run)
     return time_vec
@@ -549,11 +557,43 @@ def get_running_time(t):
 def get_tree_vec(tree, var, cut='', dtype=None, nentries=None, firstentry=0):
     strings = make_list(var)
     n = tree.Draw(':'.join(strings), cut, 'goff', choose(nentries, tree.kMaxEntries), firstentry)
-    dtypes = dtype if type(dtype) in [list, ndarray] else full(strings.size, dtype)
-    vals = [get_buf(tree.GetVal(i), n, dtypes[i]) for i in range(strings.size)]
+    if n > tree.GetEstimate():  # the buffer only holds the first GetEstimate() values
+        tree.SetEstimate(n)
+        n = tree.Draw(':'.join(strings), cut, 'goff', choose(nentries, tree.kMaxEntries), firstentry)
+    return read_tree_vals(tree, n, strings.size, dtype)
+
+
+def read_tree_vals(tree, n, n_var=1, dtype=None):
+    dtypes = dtype if type(dtype) in [list, ndarray] else full(n_var, dtype)
+    vals = [get_buf(tree.GetVal(i), n, dtypes[i]) for i in range(n_var)]
     return vals[0] if len(vals) == 1 else vals
 
 
+def iter_tree_vec(tree, var, cut='', dtype=None, chunk=1e6, nentries=None, firstentry=0):
+    """ yields the values of :func:`get_tree_vec` for windows of [chunk] entries, so the tree buffer only holds a single window. """
+    strings, chunk, est = make_list(var), int(chunk), tree.GetEstimate()
+    last = tree.GetEntries() if nentries is None else min(tree.GetEntries(), firstentry + int(nentries))
+    tree.SetEstimate(chunk)
+    try:
+        for first in range(firstentry, last, chunk):
+            n = tree.Draw(':'.join(strings), cut, 'goff', min(chunk, last - first), first)
+            if n > tree.GetEstimate():  # vector branches have more values than entries
+                tree.SetEstimate(n)
+                n = tree.Draw(':'.join(strings), cut, 'goff', min(chunk, last - first), first)
+            yield read_tree_vals(tree, n, strings.size, dtype)
+    finally:
+        tree.SetEstimate(est)
+
+
+def reduce_tree_vec(tree, var, reducers, cut='', dtype=None, chunk=1e6, nentries=None, firstentry=0):
+    """ feeds the tree values window by window to the streaming [reducers] (e.g. :class:`StreamStats`), which need the memory of a single window.
+        :returns: reducers """
+    for v in iter_tree_vec(tree, var, cut, dtype, chunk, nentries, firstentry):
+        for r in make_list(reducers):
+            r.add(*v) if type(v) is list else r.add(v)
+    return reducers
+
+
 def get_arg(arg, default):
     return default if arg is None else arg
 
@@ -562,6 +602,24 @@ def get_buf(buf, n, dtype=None):
     return frombuffer(buf, dtype=buf.typecode, count=n).astype(dtype)
 
 
+def make_entry_list(events):
+    """ :returns: TEntryList with the entries [events], filled in a single C++ call """
+    if not hasattr(ROOT, 'fill_entry_list'):
+        ROOT.gInterpreter.Declare('void fill_entry_list(TEntryList* l, const int* e, long n) { for (long i = 0; i < n; ++i) l->Enter(e[i]); }')
+    elist, events = ROOT.TEntryList(), array(events, 'i4')
+    ROOT.fill_entry_list(elist, events, events.size)
+    return elist
+
+
+def copy_entries(tree, new_tree, events):
+    """ fill the [events] of [tree] into [new_tree], which has to share the branch addresses (e.g. made with tree.CloneTree(0)), in a single C++ call """
+    if not hasattr(ROOT, 'copy_tree_entries'):
+        ROOT.gInterpreter.Declare('void copy_tree_entries(TTree* t, TTree* nt, const int* e, long n) { for (long i = 0; i < n; ++i) { t->GetEntry(e[i]); nt->Fill(); } }')
+    events = array(events, 'i4')
+    ROOT.copy_tree_entries(tree, new_tree, events, events.size)
+    return new_tree
+
+
 def calc_eff(k=0, n=0, values=None):
     values = array(values) if values is not None else None
     if n == 0 and (values is None or not values.size):
@@ -667,12 +725,15 @@ def load_pickle(file_name):
 
 def save_pickle(*pargs, print_dur=False, low_rate=False, high_rate=False, suf_args='[]', field=None, verbose=False, **pkwargs):
     def inner(func):
+        def path(*args, **kwargs):
+            run = args[0].Run.get_high_rate_run(high=not low_rate) if low_rate or high_rate else None
+            return args[0].make_simple_pickle_path(*pargs, **prep_kw(pkwargs, run=run, suf=prep_suffix(func, args, kwargs, suf_args, field)))
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             if '_no_save' in kwargs:
                 return func(*args, **kwargs)
-            run = args[0].Run.get_high_rate_run(high=not low_rate) if low_rate or high_rate else None
-            pickle_path = args[0].make_simple_pickle_path(*pargs, **prep_kw(pkwargs, run=run, suf=prep_suffix(func, args, kwargs, suf_args, field)))
+            pickle_path = path(*args, **kwargs)
             info(f'Pickle path: {pickle_path}', prnt=verbose)
             redo = (kwargs['_redo'] if '_redo' in kwargs else False) or (kwargs['show'] if 'show' in kwargs else False)
             if file_exists(pickle_path) and not redo:
@@ -682,29 +743,60 @@ def save_pickle(*pargs, print_dur=False, low_rate=False, high_rate=False, suf_ar
             value = func(*args, **kwargs)
             with open(pickle_path, 'wb') as f:
                 pickle.dump(value, f)
+            index_cache(args[0], pickle_path, func)
             (args[0].add_to_info if hasattr(args[0], 'add_to_info') else add_to_info)(t, prnt=prnt)
             return value
+        wrapper.pickle_path = path
         return wrapper
     return inner
 
 
-def save_hdf5(*pargs, suf_args='[]', **pkwargs):
+def save_hdf5(*pargs, suf_args='[]', compression=None, **pkwargs):
+    """ caches the returned array in an hdf5 file. With [compression] ('lzf' or 'gzip') it is stored as compressed integers with a scale and offset, see :class:`ScaledDataset`. """
     def inner(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             file_path = args[0].make_simple_hdf5_path(*pargs, **prep_kw(pkwargs, suf=prep_suffix(f, args, kwargs, suf_args)))
             redo = kwargs['_redo'] if '_redo' in kwargs else False
             if file_exists(file_path) and not redo:
-                return h5py.File(file_path, 'r')['data']
+                data = h5py.File(file_path, 'r')['data']
+                return ScaledDataset(data) if 'scale' in data.attrs else data
             remove_file(file_path)
             data = f(*args, **kwargs)
             hf = h5py.File(file_path, 'w')
-            hf.create_dataset('data', data=data)
-            return hf['data']
+            ds = hf.create_dataset('data', data=data) if compression is None else ScaledDataset.create(hf, data, compression=compression)
+            index_cache(args[0], file_path, f)
+            return ds
+        return wrapper
+    return inner
+
+
+def save_result(*pargs, suf_args='[]', field=None, **pkwargs):
+    """ same as :func:`save_pickle`, but the value is kept in the typed result store of the run, which holds fits, ufloats and arrays as plain hdf5 data.
+        The stored value is also written to the pickle path, which the collections use to check and load the results of the runs. """
+    def inner(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            pickle_path = args[0].make_simple_pickle_path(*pargs, **prep_kw(pkwargs, suf=prep_suffix(func, args, kwargs, suf_args, field)))
+            store = ResultStore(args[0].make_simple_hdf5_path('Results', sub_dir='Results'))
+            key = pth.splitext(pth.relpath(pickle_path, args[0].PickleDir))[0]
+            redo = (kwargs['_redo'] if '_redo' in kwargs else False) or (kwargs['show'] if 'show' in kwargs else False)
+            if key not in store or redo:
+                store[key] = func(*args, **kwargs)
+                with open(pickle_path, 'wb') as f:
+                    pickle.dump(store[key], f)
+                index_cache(args[0], pickle_path, func)
+            return store[key]
         return wrapper
     return inner
 
 
+def index_cache(ana, file_path, func):
+    if hasattr(ana, 'PickleDir'):
+        run, dut = getattr(getattr(ana, 'Run', None), 'Number', None), getattr(getattr(ana, 'DUT', None), 'Number', None)
+        CacheIndex.from_dir(ana.PickleDir).add(file_path, getattr(ana, 'TCString', None), run, dut, func.__qualname__, pth.basename(file_path))
+
+
 def print_duration(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -792,6 +884,722 @@ class PBar(object):
         self.update(i - 1)
 
 
+class H5Writer(object):
+    """ buffers rows of datasets and writes them in a single transaction into the hdf5 file [file_path].
+        An exclusive lock on a file next to it makes several processes write one after another. """
+
+    def __init__(self, file_path):
+        self.FilePath = file_path
+        self.Data = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} for {self.FilePath} with {sum(len(v[1]) for v in self.Data.values())} buffered rows'
+
+    def add(self, name, i, data, n):
+        """ buffer [data] for row [i] of the dataset [name], which is created with [n] rows if it does not exist yet. """
+        self.Data.setdefault(name, [n, {}])[1][i] = array(data, 'd')
+
+    def flush(self):
+        if not self.Data:
+            return
+        with open(f'{self.FilePath}.lock', 'w') as lock:
+            flock(lock, LOCK_EX)
+            with h5py.File(self.FilePath, 'a') as f:
+                for name, (n, rows) in self.Data.items():
+                    i = sorted(rows)
+                    data = array([rows[j] for j in i])
+                    if name not in f:
+                        f.create_dataset(name, data=zeros((n,) + data.shape[1:], 'd'))
+                    f[name][i] = data
+            flock(lock, LOCK_UN)
+        self.Data = {}
+
+
+class FitResult(object):
+    """ lightweight fit result that only holds plain arrays. Provides the same getters as FitRes. """
+
+    def __init__(self, pars, errors, cov=None, chi2=0., ndf=0, names=None):
+        self.Pars, self.Errors = array(pars, 'd'), array(errors, 'd')
+        self.Cov = diag(self.Errors ** 2) if cov is None else array(cov, 'd')
+        self.Chi2, self.NDF = float(chi2), int(ndf)
+        self.Names = [f'p{i}' for i in range(self.Pars.size)] if names is None else list(names)
+
+    def __getitem__(self, item):
+        return self.get_pars()[item]
+
+    def __len__(self):
+        return self.Pars.size
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}: {", ".join(f"{n}={v}" for n, v in zip(self.Names, self.get_pars()))}, chi2/ndf={self.get_chi2():.2f}'
+
+    @classmethod
+    def from_fit(cls, fit):
+        """ :returns: result of a TFitResultPtr or FitRes. FitRes does not provide the covariance, so it is diagonal in that case. """
+        if hasattr(fit, 'GetCovarianceMatrix'):
+            n, cov = fit.NPar(), fit.GetCovarianceMatrix()
+            return cls([fit.Parameter(i) for i in range(n)], [fit.ParError(i) for i in range(n)], [[cov(i, j) for j in range(n)] for i in range(n)], fit.Chi2(), fit.Ndf(), [fit.ParName(i) for i in range(n)])
+        return cls(fit.get_pars(err=False), [v.s for v in fit.get_pars()], chi2=fit.get_chi2() * fit.Ndf(), ndf=fit.Ndf())
+
+    def get_pars(self, err=True):
+        return array([ufloat(v, e) for v, e in zip(self.Pars, self.Errors)]) if err else self.Pars
+
+    def get_chi2(self):
+        return self.Chi2 / self.NDF if self.NDF else 0.
+
+    def Ndf(self):
+        return self.NDF
+
+
+class ResultStore(object):
+    """ typed result store in one hdf5 file. Fits are kept as arrays (parameters, errors, covariance, chi², ndf), ufloats as [value, error] and other values as they are. """
+
+    def __init__(self, file_path):
+        self.FilePath = str(file_path)
+
+    def __contains__(self, key):
+        if not file_exists(self.FilePath):
+            return False
+        with h5py.File(self.FilePath, 'r') as f:
+            return key in f
+
+    def __getitem__(self, key):
+        with h5py.File(self.FilePath, 'r') as f:
+            d, kind = f[key], f[key].attrs['kind']
+            if kind == 'fit':
+                return FitResult(d['pars'][()], d['errors'][()], d['cov'][()], d.attrs['chi2'], d.attrs['ndf'], [n.decode() for n in d['names'][()]])
+            v = d[()]
+            return ufloat(*v) if kind == 'ufloat' else array([ufloat(*i) for i in v.reshape(-1, 2)]).reshape(v.shape[:-1]) if kind == 'uarray' else v.item() if v.ndim == 0 else v
+
+    def __setitem__(self, key, value):
+        with open(f'{self.FilePath}.lock', 'w') as lock:
+            flock(lock, LOCK_EX)
+            with h5py.File(self.FilePath, 'a') as f:
+                if key in f:
+                    del f[key]
+                if isinstance(value, FitResult) or hasattr(value, 'GetCovarianceMatrix') or hasattr(value, 'get_pars'):
+                    r, d = value if isinstance(value, FitResult) else FitResult.from_fit(value), f.create_group(key)
+                    for name, v in [('pars', r.Pars), ('errors', r.Errors), ('cov', r.Cov), ('names', array(r.Names, 'S'))]:
+                        d.create_dataset(name, data=v)
+                    d.attrs.update({'kind': 'fit', 'chi2': r.Chi2, 'ndf': r.NDF})
+                elif isinstance(value, AffineScalarFunc):
+                    d = f.create_dataset(key, data=[value.n, value.s])
+                    d.attrs['kind'] = 'ufloat'
+                elif is_iter(value) and len(value) and isinstance(array(value).flat[0], AffineScalarFunc):
+                    d = f.create_dataset(key, data=array([[v.n, v.s] for v in array(value).flat]).reshape(array(value).shape + (2,)))
+                    d.attrs['kind'] = 'uarray'
+                else:
+                    d = f.create_dataset(key, data=value)
+                    d.attrs['kind'] = 'value'
+            flock(lock, LOCK_UN)
+
+    def keys(self):
+        if not file_exists(self.FilePath):
+            return []
+        with h5py.File(self.FilePath, 'r') as f:
+            keys = []
+            f.visititems(lambda name, obj: keys.append(name) if 'kind' in obj.attrs else None)
+            return keys
+
+
+def compare_result_store(n=100, file_path=None):
+    """ round trip of [n] fits, ufloats, ufloat arrays and values through :class:`ResultStore` and pickle. Checks that the values are equal and compares the load times. """
+    rng, file_path = default_rng(), choose(file_path, join(gettempdir(), 'result-store-test.hdf5'))
+    data = {f'fit{i}': FitResult(rng.normal(size=3), rng.random(3), chi2=rng.random(), ndf=10) for i in range(n)}
+    data.update({'u': ufloat(1, .1), 'ua': array([ufloat(*i) for i in rng.random((5, 2))]), 'arr': rng.random(100), 'v': 3.})
+    remove_file(file_path, prnt=False)
+    store = ResultStore(file_path)
+    for key, value in data.items():
+        store[key] = value
+    t0 = time()
+    values = {key: store[key] for key in data}
+    t1 = time()
+    pickles = {key: pickle.loads(pickle.dumps(value)) for key, value in data.items()}
+    t2 = time()
+    nominal = lambda a: [getattr(v, 'n', v) for v in array(a).flat] + [getattr(v, 's', 0) for v in array(a).flat]
+    same = lambda a, b: all(allclose(x, y) for x, y in [(a.Pars, b.Pars), (a.Errors, b.Errors), (a.Cov, b.Cov)]) and a.NDF == b.NDF if isinstance(a, FitResult) else allclose(nominal(a), nominal(b))
+    ok = all(same(data[key], values[key]) and same(data[key], pickles[key]) for key in data)
+    info(f'round trip of {len(data)} results: {"ok" if ok else "FAILED"}, store {(t1 - t0) / len(data) * 1e3:.2f} ms, pickle round trip {(t2 - t1) / len(data) * 1e3:.3f} ms per result')
+    remove_file(file_path, prnt=False)
+    remove_file(f'{file_path}.lock', prnt=False)
+    return ok
+
+
+class CacheIndex(object):
+    """ SQLite index of the cached files with test campaign, run, DUT, function, arguments and size, so that the cache can be queried without globbing. """
+
+    def __init__(self, file_path):
+        self.FilePath = str(file_path)
+        self.execute('CREATE TABLE IF NOT EXISTS cache (path TEXT PRIMARY KEY, tc TEXT, run INTEGER, dut INTEGER, func TEXT, args TEXT, size INTEGER, time REAL)')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {self.execute("SELECT COUNT(*) FROM cache")[0][0]} entries'
+
+    @classmethod
+    def from_dir(cls, pickle_dir):
+        """ the index lies next to the pickle directory """
+        return cls(f'{str(pickle_dir).rstrip("/")}.sqlite').backfill(pickle_dir)
+
+    def backfill(self, pickle_dir):
+        """ adds the files in [pickle_dir], which were cached before the index existed. This is only done once per index. """
+        self.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        if not self.execute('SELECT value FROM meta WHERE key = ?', ('filled',)):
+            files = [f for f in glob(join(str(pickle_dir), '**', '*'), recursive=True) if f.endswith(('.pickle', '.hdf5'))]
+            self.execute('INSERT OR IGNORE INTO cache (path, args, size, time) VALUES (?, ?, ?, ?)', [(f, pth.basename(f), stat(f).st_size, stat(f).st_mtime) for f in files], many=True)
+            self.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('filled', str(time())))
+        return self
+
+    def execute(self, cmd, *args, many=False):
+        con = sqlite3.connect(self.FilePath, timeout=60)
+        with con:
+            ret = (con.executemany if many else con.execute)(cmd, *args).fetchall()
+        con.close()
+        return ret
+
+    def add(self, path, tc, run, dut, func, args):
+        self.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (str(path), tc, run, dut, func, args, stat(path).st_size, time()))
+
+    def remove(self, paths):
+        self.execute('DELETE FROM cache WHERE path = ?', [(str(p),) for p in paths], many=True)
+
+    @staticmethod
+    def func_cut(func):
+        """ match the qualified name (Class.func) or only the function name """
+        return '(func = ? OR func LIKE ?)', [func, f'%.{func}']
+
+    def existing(self, paths, n=500):
+        """ :returns: the indexed paths of [paths]. The files are not checked, rows of files which were deleted outside of the index are removed when loading them fails. """
+        paths = [str(p) for p in paths]
+        return {r[0] for i in range(0, len(paths), n) for r in self.execute(f'SELECT path FROM cache WHERE path IN ({",".join("?" * len(paths[i:i + n]))})', paths[i:i + n])}
+
+    def get_runs(self, func, tc=None, dut=None):
+        cut, args = self.func_cut(func)
+        cut, args = ' AND '.join([cut] + [f'{n} = ?' for n, v in [('tc', tc), ('dut', dut)] if v is not None]), args + [v for v in [tc, dut] if v is not None]
+        return sorted(r[0] for r in self.execute(f'SELECT DISTINCT run FROM cache WHERE {cut}', args) if r[0] is not None)
+
+    def runs_without(self, func, runs, tc=None, dut=None):
+        """ :returns: the [runs] without any cached entry of [func] """
+        cached = set(self.get_runs(func, tc, dut))
+        return [run for run in runs if run not in cached]
+
+    def get_size(self, tc=None):
+        """ :returns: total bytes by function """
+        return dict(self.execute(f'SELECT func, SUM(size) FROM cache {"" if tc is None else "WHERE tc = ?"} GROUP BY func ORDER BY SUM(size) DESC', [] if tc is None else [tc]))
+
+
+class Prefetcher(object):
+    """ iterates over [items] and reads the files of the next [depth] items in a background thread, so that they are in the page cache when they are needed.
+        :param get_files: function that returns the file paths of an item
+        :param max_size: maximum number of bytes, which are read ahead of the current item """
+
+    def __init__(self, items, get_files, depth=1, max_size=2e9, chunk_size=2 ** 24):
+        self.Items, self.GetFiles = list(items), get_files
+        self.Depth, self.MaxSize, self.ChunkSize = int(depth), max_size, int(chunk_size)
+        self.Queue = Queue()
+        self.Size = {}  # bytes read ahead per item
+        self.Lock = Lock()
+
+    def __iter__(self):
+        if self.Depth < 1:
+            yield from self.Items
+            return
+        Thread(target=self.work, daemon=True).start()
+        try:
+            for i in range(1, min(self.Depth + 1, len(self.Items))):
+                self.Queue.put(i)
+            for i, item in enumerate(self.Items):
+                if 1 <= i and i + self.Depth < len(self.Items):
+                    self.Queue.put(i + self.Depth)
+                with self.Lock:
+                    self.Size.pop(i, None)
+                yield item
+        finally:  # also stop the worker if the loop is left early
+            self.Queue.put(None)
+
+    def __len__(self):
+        return len(self.Items)
+
+    def work(self):
+        while True:
+            i = self.Queue.get()
+            if i is None:
+                return
+            for f in self.GetFiles(self.Items[i]):
+                with self.Lock:
+                    if not file_exists(f) or sum(self.Size.values()) + stat(f).st_size > self.MaxSize:
+                        continue
+                    self.Size[i] = self.Size.get(i, 0) + stat(f).st_size
+                self.read(f)
+
+    def read(self, file_name):
+        """ read the file in chunks and throw the data away, only the page cache is kept. """
+        n = 0
+        with open(file_name, 'rb') as f:
+            while True:
+                b = f.read(self.ChunkSize)
+                if not b:
+                    return n
+                n += len(b)
+
+
+class SharedArray(object):
+    """ numpy array in shared memory. Only the name of the memory block is pickled, so Pool workers attach to it as a view without copying the data.
+        The creating process has to free the memory with close() or by using it as context manager. """
+
+    def __init__(self, shape=None, dtype='d', data=None, name=None):
+        data = None if data is None else asarray(data)
+        self.Shape, self.DType = (data.shape, data.dtype) if data is not None else (tuple(shape) if is_iter(shape) else (int(shape),), dtype)
+        self.Owner = name is None
+        self.SHM = SharedMemory(create=True, size=max(1, int(prod(self.Shape)) * dtype_(self.DType).itemsize)) if self.Owner else self.attach(name)
+        self.Array = ndarray(self.Shape, self.DType, buffer=self.SHM.buf)
+        if data is not None:
+            self.Array[:] = data
+
+    def __reduce__(self):
+        return self.__class__, (self.Shape, self.DType, None, self.SHM.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, 'SHM'):
+            self.Array = None
+            self.SHM.close()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} {self.SHM.name} with shape {self.Shape} ({make_byte_string(self.Array.nbytes)})'
+
+    @staticmethod
+    def attach(name):
+        try:
+            return SharedMemory(name=name, track=False)
+        except TypeError:  # python < 3.13 always tracks the block, the Pool workers share the resource tracker of the parent
+            return SharedMemory(name=name)
+
+    def close(self):
+        self.Array = None
+        self.SHM.close()
+        if self.Owner:
+            self.SHM.unlink()
+            self.Owner = False
+
+
+class ScaledDataset(object):
+    """ integer hdf5 dataset with the attributes scale and offset, which reads like the float dataset: data = values * scale + offset. """
+
+    Chunks = (256, 256)
+
+    def __init__(self, data):
+        self.Data = data
+        self.Scale, self.Offset = data.attrs['scale'], data.attrs['offset']
+        self.shape, self.dtype = data.shape, dtype_('f4')
+
+    def __getitem__(self, item):
+        return (self.Data[item] * self.Scale + self.Offset).astype(self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return self[()] if dtype is None else self[()].astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} {self.Data.name} with shape {self.shape} ({self.Data.dtype}, scale {self.Scale:.3e}, offset {self.Offset:.3e})'
+
+    @property
+    def nbytes(self):
+        return self.Data.id.get_storage_size()
+
+    @staticmethod
+    def quantise(data, dtype='i2', n=1e5, chunk=1e6):
+        """ :returns: integer values, scale and offset of [data]. The scale is the step of the ADC grid if all data lie on one (lossless), otherwise the finest step which fits the range into [dtype].
+            The grid is guessed from the first [n] values and verified and converted in chunks of [chunk] values. """
+        data, info_, c = asarray(data), iinfo(dtype), int(chunk)
+        flat, vmin, vmax = data.reshape(-1), float(data.min()), float(data.max())
+        x = unique(flat[:int(n)].astype('d'))
+        step = diff(x).min() if x.size > 1 else 0.
+        on_grid = lambda v: allclose((v - vmin) / step, rint((v - vmin) / step), atol=1e-3)
+        if not step or (vmax - vmin) / step > info_.max - info_.min or not all(on_grid(flat[i:i + c].astype('d')) for i in range(0, flat.size, c)):
+            step = (vmax - vmin) / (info_.max - info_.min) if vmax > vmin else 1.
+        offset, values = vmin - info_.min * step, empty(data.shape, dtype)
+        for i in range(0, flat.size, c):
+            values.reshape(-1)[i:i + c] = rint((flat[i:i + c].astype('d') - offset) / step).clip(info_.min, info_.max)
+        return values, step, offset
+
+    @classmethod
+    def create(cls, f, data, name='data', compression='lzf', chunks=None):
+        """ stores [data] as integers with the given filter ('lzf' or 'gzip' with shuffle) in the open hdf5 file [f].
+            The square chunks keep reading single events as well as single samples of all events cheap. """
+        values, scale, offset = cls.quantise(data)
+        chunks = tuple(min(c, s) for c, s in zip(choose(chunks, cls.Chunks), values.shape)) if values.ndim == 2 else True
+        gzip = compression == 'gzip'
+        ds = f.create_dataset(name, data=values, chunks=chunks, compression=compression, shuffle=gzip, compression_opts=4 if gzip else None)
+        ds.attrs['scale'], ds.attrs['offset'] = scale, offset
+        return cls(ds)
+
+
+class StreamStats(object):
+    """ count, mean and standard deviation of a stream of values. Chunks and partial results of other workers are merged with the update of Chan et al. """
+
+    def __init__(self):
+        self.N, self.Mean, self.M2 = 0, 0., 0.
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {self.N} values: {self.Mean:.3f} +- {self.std:.3f}'
+
+    @property
+    def std(self):
+        return sqrt(self.M2 / self.N) if self.N else 0.
+
+    def add(self, x):
+        x = asarray(x, 'd').ravel()
+        return self.update(x.size, x.mean(), ((x - x.mean()) ** 2).sum()) if x.size else self
+
+    def merge(self, other):
+        return self.update(other.N, other.Mean, other.M2)
+
+    def update(self, n, m, m2):
+        if n:
+            d, nt = m - self.Mean, self.N + n
+            self.Mean += d * n / nt
+            self.M2 += m2 + d ** 2 * self.N * n / nt
+            self.N = nt
+        return self
+
+
+class StreamHist(object):
+    """ histogram of a stream of values with fixed [bins] (edges or the [n, edges] of :class:`Bins`). Values outside of the edges are not counted. """
+
+    def __init__(self, bins):
+        self.Edges = asarray(bins[1] if len(bins) == 2 and is_iter(bins[1]) else bins, 'd')
+        self.Counts = zeros(self.Edges.size - 1)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {self.Counts.size} bins and {self.Counts.sum():.0f} entries'
+
+    def add(self, x, w=None):
+        self.Counts += histogram(x, self.Edges, weights=w)[0]
+        return self
+
+    def merge(self, other):
+        self.Counts += other.Counts
+        return self
+
+
+class StreamProfile(StreamHist):
+    """ mean, standard deviation and error of the mean of [y] in the [bins] of [x] for a stream of value pairs. """
+
+    def __init__(self, bins):
+        super().__init__(bins)
+        self.Sum, self.Sum2 = zeros(self.Counts.size), zeros(self.Counts.size)
+
+    def add(self, x, y, w=None, is_sorted=False):
+        """ sums the values per bin with bincount, or with cumulative sums at the bin edges if [x] is sorted (e.g. time). """
+        y, w = asarray(y, 'd'), None if w is None else asarray(w, 'd')
+        if is_sorted:
+            j = searchsorted(x, self.Edges)
+            wy = y if w is None else w * y
+            self.Counts += diff(j) if w is None else diff(concatenate([[0], cumsum(w)])[j])
+            self.Sum += diff(concatenate([[0], cumsum(wy)])[j])
+            self.Sum2 += diff(concatenate([[0], cumsum(wy * y)])[j])
+            return self
+        i, n = searchsorted(self.Edges, x, side='right') - 1, self.Counts.size
+        cut = (i >= 0) & (i < n)
+        if not cut.all():
+            i, y, w = i[cut], y[cut], None if w is None else w[cut]
+        wy = y if w is None else w * y
+        self.Counts += bincount(i, w, n)
+        self.Sum += bincount(i, wy, n)
+        self.Sum2 += bincount(i, wy * y, n)
+        return self
+
+    def merge(self, other):
+        for a, b in [(self.Counts, other.Counts), (self.Sum, other.Sum), (self.Sum2, other.Sum2)]:
+            a += b
+        return self
+
+    @property
+    def mean(self):
+        with errstate(invalid='ignore'):
+            return self.Sum / self.Counts
+
+    @property
+    def std(self):
+        with errstate(invalid='ignore'):
+            return sqrt((self.Sum2 / self.Counts - self.mean ** 2).clip(0))
+
+    @property
+    def err(self):
+        with errstate(invalid='ignore', divide='ignore'):
+            return self.std / sqrt(self.Counts)
+
+    def get_values(self, sigma=False):
+        """ :returns: mean or standard deviation of every bin with its error as ufloats """
+        with errstate(invalid='ignore', divide='ignore'):
+            v, e = (self.std, self.std / sqrt(2 * self.Counts)) if sigma else (self.mean, self.err)
+        return array([ufloat(*i) for i in zip(v, e)])
+
+    def rebin(self, bins):
+        """ :returns: profile with the coarser [bins] derived by summing the adjacent fine bins. The coarse edges are moved to the closest fine edges,
+            so the result equals the directly computed profile if they lie on the fine grid. """
+        j = find_closest_edges(self.Edges, bins[1] if len(bins) == 2 and is_iter(bins[1]) else bins)
+        p = StreamProfile(self.Edges[j])
+        for a, b in [(p.Counts, self.Counts), (p.Sum, self.Sum), (p.Sum2, self.Sum2)]:
+            a += diff(concatenate([[0], cumsum(b)])[j])
+        return p
+
+
+class StreamProfile2D(object):
+    """ counts, sums and sums of squares of [z] on a 2D grid with the [bins] ([x edges, y edges] or [nx, x edges, ny, y edges]) for a stream of values.
+        Coarser maps, sub regions and projections are derived by block summation, the TProfile2D is only built for drawing. """
+
+    def __init__(self, bins):
+        self.XEdges, self.YEdges = [asarray(e, 'd') for e in (bins[1::2] if len(bins) == 4 else bins)]
+        shape = (self.XEdges.size - 1, self.YEdges.size - 1)
+        self.Counts, self.Sum, self.Sum2 = zeros(shape), zeros(shape), zeros(shape)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {self.Counts.shape[0]}x{self.Counts.shape[1]} bins and {self.Counts.sum():.0f} entries'
+
+    def add(self, x, y, z, w=None):
+        (nx, ny), (i, j) = self.Counts.shape, [searchsorted(e, v, side='right') - 1 for e, v in [(self.XEdges, x), (self.YEdges, y)]]
+        cut = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+        k, z, w = (i * ny + j)[cut], asarray(z, 'd')[cut], None if w is None else asarray(w, 'd')[cut]
+        wz = z if w is None else w * z
+        for a, v in [(self.Counts, w), (self.Sum, wz), (self.Sum2, wz * z)]:
+            a += bincount(k, v, nx * ny).reshape(nx, ny)
+        return self
+
+    def merge(self, other):
+        for a, b in [(self.Counts, other.Counts), (self.Sum, other.Sum), (self.Sum2, other.Sum2)]:
+            a += b
+        return self
+
+    @property
+    def mean(self):
+        with errstate(invalid='ignore'):
+            return self.Sum / self.Counts
+
+    @property
+    def std(self):
+        with errstate(invalid='ignore'):
+            return sqrt((self.Sum2 / self.Counts - self.mean ** 2).clip(0))
+
+    @property
+    def err(self):
+        with errstate(invalid='ignore', divide='ignore'):
+            return self.std / sqrt(self.Counts)
+
+    def rebin(self, bins):
+        """ :returns: map with the coarser [bins] or a sub region, summed from the blocks of fine bins. The edges are moved to the closest fine edges. """
+        xe, ye = bins[1::2] if len(bins) == 4 else bins
+        i, j = find_closest_edges(self.XEdges, xe), find_closest_edges(self.YEdges, ye)
+        p = StreamProfile2D([self.XEdges[i], self.YEdges[j]])
+        for a, b in [(p.Counts, self.Counts), (p.Sum, self.Sum), (p.Sum2, self.Sum2)]:
+            c = zeros((b.shape[0] + 1, b.shape[1] + 1))
+            c[1:, 1:] = b.cumsum(0).cumsum(1)
+            a += diff(diff(c[i][:, j], axis=0), axis=1)
+        return p
+
+    def project(self, axis='x'):
+        """ :returns: :class:`StreamProfile` of the projection onto [axis] """
+        p = StreamProfile(self.XEdges if axis == 'x' else self.YEdges)
+        for a, b in [(p.Counts, self.Counts), (p.Sum, self.Sum), (p.Sum2, self.Sum2)]:
+            a += b.sum(1 if axis == 'x' else 0)
+        return p
+
+    def make_prof2d(self, title='', name=None):
+        """ :returns: TProfile2D with the same bin entries, sums and sums of squares """
+        p = ROOT.TProfile2D(choose(name, f'p2d{id(self)}'), title, self.XEdges.size - 1, self.XEdges, self.YEdges.size - 1, self.YEdges)
+        for i, j in array(where(self.Counts > 0)).T:
+            b = p.GetBin(int(i) + 1, int(j) + 1)
+            p.SetBinEntries(b, self.Counts[i, j])
+            p.SetBinContent(b, self.Sum[i, j])
+            p.GetSumw2().SetAt(self.Sum2[i, j], b)
+        p.SetEntries(self.Counts.sum())
+        return p
+
+
+def find_closest_edges(edges, e):
+    """ :returns: indices of the [edges] closest to the coarser edges [e] """
+    e = asarray(e, 'd')
+    j = searchsorted(edges, e).clip(1, edges.size - 1)
+    return j - (e - edges[j - 1] < edges[j] - e)
+
+
+def on_grid(edges, e):
+    """ :returns: whether all edges [e] coincide with one of the fine [edges], i.e. whether a rebinning to [e] is exact """
+    edges, e = asarray(edges, 'd'), asarray(e, 'd')
+    return e.size > 0 and abs(edges[find_closest_edges(edges, e)] - e).max() < 1e-6 * diff(edges).min()
+
+
+class BinnedQuantiles(object):
+    """ mergeable quantile sketches of [y] in the [bins] of [x], like :class:`QuantileSketch` for every bin.
+        All bins are compressed at once by sorting with the bin as first key, so there is no loop over the bins. """
+
+    def __init__(self, bins, size=100):
+        self.Edges = asarray(bins[1] if len(bins) == 2 and is_iter(bins[1]) else bins, 'd')
+        self.NBins, self.Size = self.Edges.size - 1, int(size)
+        self.Bins, self.Values, self.Weights = zeros(0, 'i8'), zeros(0), zeros(0)
+        self.Min, self.Max = full(self.NBins, inf), full(self.NBins, -inf)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {self.Weights.sum():.0f} values in {self.NBins} bins with {self.Values.size} centroids'
+
+    def add(self, x, y, w=None):
+        i = searchsorted(self.Edges, x, side='right') - 1
+        cut = (i >= 0) & (i < self.NBins)
+        return self.append(i[cut], asarray(y, 'd')[cut], ones(count_nonzero(cut)) if w is None else asarray(w, 'd')[cut])
+
+    def merge(self, other):
+        self.Min, self.Max = minimum(self.Min, other.Min), maximum(self.Max, other.Max)
+        return self.append(other.Bins, other.Values, other.Weights)
+
+    def append(self, b, v, w):
+        self.Bins, self.Values, self.Weights = concatenate([self.Bins, b]), concatenate([self.Values, v]), concatenate([self.Weights, w])
+        if self.Values.size > 2 * self.Size * self.NBins:
+            self.compress()
+        return self
+
+    def sort(self):
+        """ sorts the entries by bin and value and updates the extrema of the bins.
+            :returns: bins, values, weights, cumulative weights inside of the bins, total weights of the bins """
+        lo, hi = (self.Values.min(), self.Values.max()) if self.Values.size else (0, 0)
+        s = argsort(self.Bins + ((self.Values - lo) / (hi - lo) / 2 if hi > lo else 0))  # single sort key: bin + scaled value in [0, .5]
+        b, v, w = self.Bins[s], self.Values[s], self.Weights[s]
+        n, tw = bincount(b, minlength=self.NBins), bincount(b, w, self.NBins)
+        last, has = cumsum(n) - 1, n > 0
+        self.Min[has], self.Max[has] = minimum(self.Min[has], v[last[has] - n[has] + 1]), maximum(self.Max[has], v[last[has]])
+        c = cumsum(w)
+        return b, v, w, c - (c[last] - tw)[b] if c.size else c, tw
+
+    def compress(self):
+        b, v, w, c, tw = self.sort()
+        g = b * self.Size + minimum(((c - w / 2) / tw[b] * self.Size).astype('i8'), self.Size - 1)  # groups of equal weight in every bin
+        wn = bincount(g, w, self.NBins * self.Size)
+        cut = wn > 0
+        self.Bins, self.Values, self.Weights = (arange(wn.size) // self.Size)[cut], bincount(g, w * v, wn.size)[cut] / wn[cut], wn[cut]
+
+    def quantile(self, q):
+        """ :returns: interpolated values at the quantiles [q] with shape (n bins, n quantiles), nan for empty bins """
+        b, v, w, c, tw = self.sort()
+        q, has = asarray(q, 'd').reshape(-1), tw > 0
+        i = arange(self.NBins)[has]
+        key = concatenate([2 * b + (c - w / 2) / tw[b], 2 * i, 2 * i + 1])  # bin k covers [2k, 2k + 1] with the extrema at the ends
+        s = argsort(key, kind='stable')
+        values = interp((2 * arange(self.NBins).reshape(-1, 1) + q).ravel(), key[s], concatenate([v, self.Min[has], self.Max[has]])[s]).reshape(-1, q.size)
+        values[~has] = nan
+        return values
+
+
+def bin_stats(x, values, bins, w=None, is_sorted=False):
+    """ vectorised replacement of :func:`binned_stats` for the count, sum, mean and std of [values] in the [bins] of [x].
+        :returns: :class:`StreamProfile`, which can be merged with the results of other chunks or workers """
+    return StreamProfile(bins).add(x, values, w, is_sorted)
+
+
+def compare_binned_stats(n=1e7, n_bins=500, q=(.1, .5, .9)):
+    """ compare :func:`binned_stats` with :func:`bin_stats` and :class:`BinnedQuantiles` for [n] sorted entries in [n_bins] bins. """
+    rng = default_rng()
+    x, y, b = arange(int(n), dtype='d'), rng.normal(10, 2, int(n)), linspace(0, n, n_bins + 1)  # all entries inside of the bins
+    t = [time()]
+    m0 = binned_stats(x, y, lambda v: [v.mean(), v.std()], b)
+    t.append(time())
+    p = bin_stats(x, y, b)
+    t.append(time())
+    bin_stats(x, y, b, is_sorted=True)
+    t.append(time())
+    q0 = binned_stats(x, y, lambda v: quantile(v, q), b)
+    t.append(time())
+    q1 = BinnedQuantiles(b).add(x, y).quantile(q)
+    t.append(time())
+    info('mean/std with split: {:.2f} s, bincount: {:.2f} s, sorted: {:.2f} s; quantiles with split: {:.2f} s, sketches: {:.2f} s'.format(*diff(t)))
+    info(f'max deviation of mean: {abs(p.mean - m0[:, 0]).max():.1e}, std: {abs(p.std - m0[:, 1]).max():.1e}, quantiles: {abs(q1 - q0).max():.1e}')
+    return m0, q0, p, q1
+
+
+def gauss_pars(x, n_sigma=2., n_iter=20, tol=1e-6):
+    """ robust Gaussian mean and sigma of every row of [x] (nan for missing entries) at once. The mean and std are iteratively truncated at [n_sigma]
+        around the mean, starting from the median and the MAD, and the std is corrected for the truncation of the Gaussian tails.
+        :returns: mean and sigma as ufloats with shape (rows, 2) """
+    x = atleast_2d(asarray(x, 'd'))
+    m = nanmedian(x, axis=1)
+    s = nanmedian(abs(x - m[:, None]), axis=1) * 1.4826
+    c = sqrt(1 - 2 * n_sigma * exp(-n_sigma ** 2 / 2) / sqrt(2 * pi) / erf(n_sigma / sqrt(2)))  # std of the standard normal truncated at +-n_sigma
+    for _ in range(n_iter):
+        with errstate(invalid='ignore', divide='ignore'):
+            w = abs(x - m[:, None]) < n_sigma * s[:, None]  # nan entries are never inside
+            n = w.sum(axis=1)
+            m1 = where(w, x, 0).sum(axis=1) / n
+            s1 = sqrt(where(w, (x - m1[:, None]) ** 2, 0).sum(axis=1) / n) / c
+        done = (abs(m1 - m) <= tol * s1) & (abs(s1 - s) <= tol * s1)
+        m, s = m1, s1
+        if done.all():
+            break
+    with errstate(invalid='ignore', divide='ignore'):
+        return array([[ufloat(im, js / sqrt(k)), ufloat(js, js / sqrt(2 * k))] for im, js, k in zip(m, s, n)])
+
+
+class QuantileSketch(object):
+    """ mergeable quantile sketch with bounded memory. The sorted values are merged into at most [size] weighted centroids of equal weight,
+        which limits the rank error of the quantiles to about 1 / size. """
+
+    def __init__(self, size=1000):
+        self.Size = int(size)
+        self.Values, self.Weights = zeros(0), zeros(0)
+        self.Min, self.Max = inf, -inf
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {self.N:.0f} values with {self.Values.size} centroids'
+
+    @property
+    def N(self):
+        return self.Weights.sum()
+
+    def add(self, x, w=None):
+        x = asarray(x, 'd').ravel()
+        if x.size:
+            self.Min, self.Max = min(self.Min, x.min()), max(self.Max, x.max())
+            self.Values, self.Weights = concatenate([self.Values, x]), concatenate([self.Weights, ones(x.size) if w is None else asarray(w, 'd').ravel()])
+            if self.Values.size > 2 * self.Size:
+                self.compress()
+        return self
+
+    def merge(self, other):
+        if other.Values.size:
+            self.Min, self.Max = min(self.Min, other.Min), max(self.Max, other.Max)
+            self.Values, self.Weights = concatenate([self.Values, other.Values]), concatenate([self.Weights, other.Weights])
+            self.compress()
+        return self
+
+    def compress(self):
+        s = argsort(self.Values, kind='stable')
+        v, w = self.Values[s], self.Weights[s]
+        c = cumsum(w)
+        g = minimum(((c - w / 2) / c[-1] * self.Size).astype('i'), self.Size - 1)  # group of equal weight for every value
+        w_new = bincount(g, w, self.Size)
+        cut = w_new > 0
+        self.Values, self.Weights = bincount(g, w * v, self.Size)[cut] / w_new[cut], w_new[cut]
+
+    def quantile(self, q):
+        """ :returns: interpolated values at the quantiles [q] """
+        if not self.Values.size:
+            return full(asarray(q).shape, nan)
+        s = argsort(self.Values, kind='stable')
+        v, w = self.Values[s], self.Weights[s]
+        c = cumsum(w)
+        return interp(asarray(q) * c[-1], concatenate([[0], c - w / 2, [c[-1]]]), concatenate([[self.Min], v, [self.Max]]))
+
+
 class EventSpeed(Widget):
     """Widget for showing the event speed (useful for slow updates)."""
 
@@ -934,6 +1742,35 @@ def gauss(x, scale, mean_, sigma, off=0):
     return scale * exp(-.5 * ((x - mean_) / sigma) ** 2) + off
 
 
+LAN_P = array([[.4259894875, -.1249762550, .03984243700, -.006298287635, .001511162253], [.1788541609, .1173957403, .01488850518, -.001394989411, .0001283617211],
+               [.1788544503, .09359161662, .006325387654, .00006611667319, -.000002031049101], [.9874054407, 118.6723273, 849.2794360, -743.7792444, 427.0262186],
+               [1.003675074, 167.5702434, 4789.711289, 21217.86767, -22324.94910], [1.000827619, 664.9143136, 62972.92665, 475554.6998, -5743609.109]])
+LAN_Q = array([[1, -.3388260629, .09594393323, -.01608042283, .003778942063], [1, .7428795082, .3153932961, .06694219548, .008790609714],
+               [1, .6097809921, .2560616665, .04746722384, .006957301675], [1, 106.8615961, 337.6496214, 2016.712389, 1597.063511],
+               [1, 156.9424537, 3745.310488, 9834.698876, 66924.28357], [1, 651.4101098, 56974.73333, 165917.4725, -2815759.939]])
+
+
+def landau(x, mpv=0, sigma=1, norm=False):
+    """ vectorised version of TMath::Landau with the same parametrisation (CERNLIB DENLAN approximation). """
+    v = (asarray(x, 'd') - mpv) / sigma
+    with errstate(all='ignore'):
+        u0, u1, ui = exp(v + 1), exp(-v - 1), 1 / v
+        r = [polyval(p[::-1], w) / polyval(q[::-1], w) for p, q, w in zip(LAN_P, LAN_Q, [v, v, v, ui, ui, ui])]
+        y0 = where(u0 < 1e-10, 0, .3989422803 * exp(-1 / u0) / sqrt(u0) * (1 + (.04166666667 + (-.01996527778 + .02709538966 * u0) * u0) * u0))
+        ul = 1 / (v - v * log(v) / (v + 1))
+        y = select([v < -5.5, v < -1, v < 1, v < 5, v < 12, v < 50, v < 300], [y0, exp(-u1) * sqrt(u1) * r[0], r[1], r[2], ui ** 2 * r[3], ui ** 2 * r[4], ui ** 2 * r[5]],
+                   ul ** 2 * (1 + (-1.845568670 - 4.284640743 * ul) * ul))
+    return y / (sigma if norm else 1)
+
+
+def landau_sample(mpv=0, sigma=1, size=None, rng=None):
+    """ :returns: Landau distributed random numbers with the parametrisation of gRandom.Landau, [rng] may be a seed or a numpy.random.Generator. """
+    rng, size = default_rng(rng), broadcast(mpv, sigma).shape if size is None else size
+    u, w = rng.uniform(-pi / 2, pi / 2, size), rng.standard_exponential(size)
+    x = (pi / 2 + u) * tan(u) - log(pi / 2 * w * cos(u) / (pi / 2 + u))  # standard stable distribution with alpha=1, beta=1 (Chambers-Mallows-Stuck)
+    return mpv + sigma * (x + log(pi / 2))  # scale pi/2 to get the standard Landau
+
+
 def fit_data(f, y, x=None, p=None):
     x = arange(y.shape[0]) if x is None else x
     return curve_fit(f, x, y, p0=p)
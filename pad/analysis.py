@@ -176,7 +176,12 @@ class PadAnalysis(DUTAnalysis):
         """ :returns: all pulse height values for a given cut. """
         return self.Run.get_tree_vec(var=self.get_signal_var(name, evnt_corr, cut=cut, region=region), cut=self.Cut(cut))
 
-    @save_pickle('Fit', sub_dir='PH', suf_args='all')
+    def get_ph_stats(self, region=None, name=None, evnt_corr=True, cut=None, q=(.05, .5, .95), chunk=1e6):
+        """ :returns: mean, standard deviation and quantiles [q] of the pulse heights, read in windows of [chunk] events to keep the memory bounded for long runs. """
+        s, qs = self.reduce_tree_vec(self.get_signal_var(name, evnt_corr, cut=cut, region=region), [StreamStats(), QuantileSketch()], self.Cut(cut), chunk=chunk)
+        return s.Mean, s.std, qs.quantile(q)
+
+    @save_result('Fit', sub_dir='PH', suf_args='all')
     def _get_pulse_height(self, bw=None, n=20, sig=None, cut=None, corr=True, _redo=False):
         """ :returns: fitted (pol0) pulse height over time """
         return self.draw_pulse_height(bw, n, sig, cut, corr, show=False, save=False, redo=_redo)[1][0]
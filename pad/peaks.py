@@ -3,9 +3,8 @@
 #       Peak analysis of the high rate pad beam tests at PSI
 # created on June 7th 2017 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
-from ROOT import TMath, TGraph
-from ROOT.gRandom import Landau as rLandau
-from numpy import polyfit, argmax, insert, invert, sum, any, sort
+from ROOT import TGraph
+from numpy import polyfit, argmax, insert, invert, sum, any, sort, take_along_axis, searchsorted, clip, errstate
 from numpy.random import normal, rand
 from scipy.signal import find_peaks
 from scipy.stats import poisson
@@ -222,8 +221,8 @@ class PeakAnalysis(PadSubAnalysis):
     def get_bunch_cfts(self, n, excl=0, cut=None):
         return self.get_bunch_values(n, None, excl, cut, 2, fit=True, pars=True)
 
-    def get_bunch_tot(self, n, excl=0, cut=None, fit=True, thresh=.75, redo=False, toa=False):
-        values = (self.find_all_toa if toa else self.find_all_tot)(thresh, fit, _redo=redo)[self.get_full_bunch_cut(n, cut=cut)]
+    def get_bunch_tot(self, n, excl=0, cut=None, fit=True, thresh=.75, redo=False, toa=False, vec=False):
+        values = (self.find_all_toa if toa else self.find_all_tot)(thresh, fit, vec, _redo=redo)[self.get_full_bunch_cut(n, cut=cut)]
         return values[int(excl * values.size):]
 
     @save_pickle('Range', suf_args='all')
@@ -513,13 +512,13 @@ class PeakAnalysis(PadSubAnalysis):
         return concatenate([fit_peaks, [fit_peaks[-1] + self.BunchSpacing]])
 
     @reload_tree
-    def _find_all(self, i0, i1, thresh=None, fit=False):
-        """find peaks for a subset. used for parallelising."""
+    def _find_all(self, i0, i1, thresh=None, fit=False, wf=None):
+        """find peaks for a subset. used for parallelising. [wf] is the shared waveform block of the parent process."""
         f = TF1('lan', 'landau', 0, 512)
         pbar = PBar(i1 - i0) if not i0 else None
         values = []
         tc = self.WF.get_trigger_cells()[i0:i1]
-        wf = self.WF.get_all()[i0:i1]
+        wf = self.WF.get_all()[i0:i1] if wf is None else wf.Array[i0:i1]
         for i in range(len(tc)):
             values.append(self.find(wf[i], tc[i], thresh, fit=f if fit else False))
             if not i0:
@@ -536,9 +535,9 @@ class PeakAnalysis(PadSubAnalysis):
             return f['times'], f['heights'], f['n_peaks']
         remove_file(hdf5_path)
 
-        with Pool() as pool:
+        with Pool() as pool, SharedArray(data=self.WF.get_all()) as wf:
             self.info('Finding peaks in waveforms ...')
-            result = pool.starmap(self._find_all, [(i, j, thresh, fit) for i, j in self.split_indices])
+            result = pool.starmap(self._find_all, [(i, j, thresh, fit, wf) for i, j in self.split_indices])
             times = [tup[0] for lst in result for tup in lst]
             heights = [tup[1] for lst in result for tup in lst]
             f = h5py.File(hdf5_path, 'w')
@@ -551,8 +550,24 @@ class PeakAnalysis(PadSubAnalysis):
         peaks = find_peaks(y[excl:], height=choose(thresh, default=self.Threshold), distance=self.Distance, prominence=self.Prominence)
         return self.fit_landau(y, tc, peaks[0] + excl, fit) if fit else ([self.WF.get_calibrated_time(tc, value) for value in peaks[0] + excl], peaks[1]['peak_heights'])
 
-    def find_pars(self, redo=False, fit=True):
+    @reload_tree
+    def _find_pars(self, i0, i1, fit=True):
+        """block-wise version of :meth:`find_pars` for a subset. used for parallelising."""
+        rwi, delay = int(10 / self.BinWidth), int(round(self.WF.get_average_rise_time().n) / self.BinWidth)
+        x, y, pt, ph = self.get_peak_blocks(i0, i1, rwi, 2, fit)
+        above = y > ph.reshape(-1, 1) / 2
+        j = above.argmax(1)  # find first value above half the peak height
+        tc, vc = self.get_peak_blocks(i0, i1, 2 * delay, delay, fit)[:2]
+        data = array([self.find_widths(y, x, pt, ph, j), self.find_slopes(y, x, j), self.find_cfts(vc, tc, delay)]).T
+        data[invert(any(above, axis=1))] = -999
+        return data
+
+    def find_pars(self, redo=False, fit=True, vec=False):
         def f():
+            if vec:
+                with Pool() as pool:
+                    self.info('calculating peak parameters ...')
+                    return concatenate(pool.starmap(self._find_pars, [(i, j, fit) for i, j in self.split_indices])).astype('d')
             t, h, n = self.get_all(cut=..., fit=fit)
             peak_info, tc = split(column_stack([t, h]), cumsum(n)[:-1]), self.WF.get_trigger_cells()
             data = []
@@ -577,7 +592,7 @@ class PeakAnalysis(PadSubAnalysis):
                         data.append([-999] * 3)
                 self.PBar.update(i)
             return array(data).astype('d')
-        return do_hdf5(self.make_simple_hdf5_path('Pars', fit), f, redo)
+        return do_hdf5(self.make_simple_hdf5_path('Pars', f'{fit}_{int(vec)}'), f, redo)  # the block results differ slightly from the per peak ones
 
     @staticmethod
     def find_tot(x, y, thresh):
@@ -593,8 +608,22 @@ class PeakAnalysis(PadSubAnalysis):
         i = (y > thresh).argmax()
         return get_x(x[i - 1], x[i], y[i - 1], y[i], thresh) if i else -999
 
+    def get_peak_blocks(self, i0, i1, left, right, fit=True):
+        """:returns: times and values in blocks with shape (n_peaks, left + right) around the peak samples of the events [i0, i1] as well as the peak times and heights."""
+        t, h, n = self.get_all(cut=..., fit=fit)
+        j0, j1 = cumsum(insert(n, 0, 0).astype('i8'))[[i0, i1]]
+        pt, ph, n = t[j0:j1], h[j0:j1], n[i0:i1].astype('i')
+        wf, tcal = array(self.WF.get_all()[i0:i1]).astype('d'), self.WF.get_all_cal_times()[self.WF.get_trigger_cells()[i0:i1]]
+        e = arange(n.size).repeat(n)  # event index of every peak
+        k = searchsorted((tcal + arange(n.size).reshape(-1, 1) * 1e4).ravel(), pt + e * 1e4, side='right') - e * self.Run.NSamples  # first sample after the peak
+        ind, e = clip(k.reshape(-1, 1) + arange(-left, right), 0, self.Run.NSamples - 1), e.reshape(-1, 1)
+        return tcal[e, ind], wf[e, ind], pt, ph
+
     @reload_tree
-    def _find_all_tot(self, i0, i1, thresh, fit=True, toa=False):
+    def _find_all_tot(self, i0, i1, thresh, fit=True, toa=False, vec=False):
+        if vec:
+            x, y, pt, ph = self.get_peak_blocks(i0, i1, int(self.BunchSpacing / 2 / self.BinWidth), int(self.BunchSpacing / self.BinWidth), fit)
+            return (self.find_toas if toa else self.find_tots)(x, y, thresh if thresh > 1 else ph * thresh)
         t, h, n = self.get_all(cut=..., fit=fit)
         peak_info, tc = split(column_stack([t, h]), cumsum(n)[:-1])[i0:i1], self.WF.get_trigger_cells()[i0:i1]
         wf, tcal, n = array(self.WF.get_all())[i0:i1], self.WF.get_all_cal_times(), n[i0:i1]
@@ -610,19 +639,72 @@ class PeakAnalysis(PadSubAnalysis):
                 pbar.update() if pbar is not None else do_nothing()
         return data
 
-    @save_hdf5('ToT', suf_args='all')
-    def find_all_tot(self, thresh=.75, fit=True, _redo=False):
+    @save_hdf5('ToT', suf_args='[0, 1, 2]')
+    def find_all_tot(self, thresh=.75, fit=True, vec=False, _redo=False):
         self.find_all(fit=fit)  # to guarantee that peaks are there!
         with Pool() as pool:
             self.info('calculating time over threshold ...')
-            return concatenate(pool.starmap(self._find_all_tot, [(i, j, thresh, fit) for i, j in self.split_indices]))
+            return concatenate(pool.starmap(self._find_all_tot, [(i, j, thresh, fit, False, vec) for i, j in self.split_indices]))
 
-    @save_hdf5('ToA', suf_args='all')
-    def find_all_toa(self, thresh=.5, fit=True, _redo=False):
+    @save_hdf5('ToA', suf_args='[0, 1, 2]')
+    def find_all_toa(self, thresh=.5, fit=True, vec=False, _redo=False):
         self.find_all(fit=fit)  # to guarantee that peaks are there!
         with Pool() as pool:
             self.info('calculating time of arrival ...')
-            return concatenate(pool.starmap(self._find_all_tot, [(i, j, thresh, fit, True) for i, j in self.split_indices]))
+            return concatenate(pool.starmap(self._find_all_tot, [(i, j, thresh, fit, True, vec) for i, j in self.split_indices]))
+
+    @staticmethod
+    def _block_x(x, y, i0, i1, thresh):
+        """:returns: linear interpolation of [thresh] between the columns [i0] and [i1] of every row. """
+        i0, i1 = [clip(i, 0, y.shape[1] - 1).reshape(-1, 1) for i in [i0, i1]]
+        with errstate(divide='ignore', invalid='ignore'):
+            return get_x(*[take_along_axis(v, i, axis=1)[:, 0] for v in [x, y] for i in [i0, i1]], thresh)
+
+    @staticmethod
+    def find_tots(x, y, thresh):
+        """ block-wise version of :meth:`find_tot` for times [x] and values [y] with shape (n_peaks, window). """
+        th, w = full(y.shape[0], thresh, 'd'), y.shape[1]
+        c = y > th.reshape(-1, 1)
+        n, i, j = count_nonzero(c, axis=1), c.argmax(1), w - 1 - c[:, ::-1].argmax(1)
+        t0 = where(i == 0, x[:, 0], PeakAnalysis._block_x(x, y, i, i - 1, th))
+        t1 = where(j == w - 1, x[:, -1], PeakAnalysis._block_x(x, y, j, j + 1, th))
+        return where((n > 0) & (j - i + 1 == n), t1 - t0, -999)  # only a single connected region above threshold
+
+    @staticmethod
+    def find_toas(x, y, thresh=.5):
+        """ block-wise version of :meth:`find_toa` for times [x] and values [y] with shape (n_peaks, window). """
+        th = full(y.shape[0], thresh, 'd')
+        i = (y > th.reshape(-1, 1)).argmax(1)
+        return where(i > 0, PeakAnalysis._block_x(x, y, i - 1, i, th), -999)
+
+    @staticmethod
+    def find_widths(values, times, pt, ph, i):
+        """ block-wise version of :meth:`find_width`. """
+        return where(i > 0, pt - PeakAnalysis._block_x(times, values, i - 1, i, ph / 2), 0)
+
+    @staticmethod
+    def find_slopes(values, times, i):
+        """ block-wise version of :meth:`find_slope` with the least squares slope from the closed-form sums. """
+        ind = clip(i.reshape(-1, 1) + arange(-2, 2), 0, values.shape[1] - 1)
+        x, y = [take_along_axis(v, ind, axis=1).astype('d') for v in [times, values]]
+        dx, dy = x - x.mean(axis=1).reshape(-1, 1), y - y.mean(axis=1).reshape(-1, 1)
+        with errstate(divide='ignore', invalid='ignore'):
+            return where(i > 1, sum(dx * dy, axis=1) / sum(dx ** 2, axis=1), 0)
+
+    @staticmethod
+    def find_cfts(values, times, delay, fac=.3):
+        """ block-wise version of :meth:`find_cft` for blocks with shape (n_peaks, 3 * delay) starting 2 * delay before the peak. """
+        v = values - roll(values, -delay, axis=1) * fac  # subtract a shifted reduced waveform
+        c = v < 0
+        j = v.shape[1] - 1 - c[:, ::-1].argmax(1)  # last value below zero
+        return where(any(c, axis=1) & (j < v.shape[1] - 1), PeakAnalysis._block_x(times, v, j, j + 1, zeros(j.size)), -999)  # interpolate the zero crossing
+
+    def compare_block_speed(self, n=10000, thresh=.75, fit=True):
+        """ measure the throughput of the peak-wise and the block-wise ToT calculation for the first [n] events. """
+        for vec in [False, True]:
+            t = self.info(f'calculating ToT {"block" if vec else "peak"}-wise ...', endl=False)
+            n_peaks = len(self._find_all_tot(0, n, thresh, fit, vec=vec))
+            self.add_to_info(t, f'Done ({n_peaks / (time() - t):.0f} peaks/s)')
 
     @staticmethod
     def find_width(values, times, pt, ph, i):
@@ -726,7 +808,7 @@ class PeakAnalysis(PadSubAnalysis):
     def signal1(self, height, peak_time, scale, landau_width=3, noise=5):
         x0, x1 = ax_range(peak_time - 2 * landau_width, peak_time + 4 * landau_width, .5, .5)
         x = arange(x0, x1, self.BinWidth, dtype='d')
-        y = array([height * scale * TMath.Landau(ix, peak_time, landau_width) for ix in x])
+        y = height * scale * landau(x, peak_time, landau_width)
         return x, y + normal(scale=noise, size=x.size)
 
     def get_signal(self, n, *args, **kwargs):
@@ -757,21 +839,20 @@ class PeakAnalysis(PadSubAnalysis):
             self.PBar.update(i)
         return array([self.find_cft(y, x, argmax(y), delay=10) if cft else x[argmax(y)], max(y).n])
 
-    def model(self, n=1e6, model=1, noise=None, cft=False, redo=False, *args, **kwargs):
-        n = int(n)
+    def model(self, n=1e6, model=1, noise=None, cft=False, redo=False, seed=None, *args, **kwargs):
+        n, rng = int(n), default_rng(seed)
         hdf5_path = self.make_simple_hdf5_path('M', f'{n}_{model}_{int(cft)}')
         if file_exists(hdf5_path) and not redo:
             f = h5py.File(hdf5_path, 'r')
             return f['times'], f['heights']
         if redo and file_exists(hdf5_path):
             remove_file(hdf5_path)
-        rLandau(5, 2)  # first value is always crap
         noise = choose(noise, self.Ana.Pedestal.get_raw_noise().n)
         mpv, w = [v.n for v in self.get_bunch_mpv(par=[1, 2])]
         pt, pts = [v.n for v in self.get_bunch_time(par=[1, 2])]
         self.PBar.start(n)
-        peak_times = normal(scale=pts, size=n) + pt
-        values = array([self._get_model_data(i, model, cft, min(500, rLandau(mpv, w)), peak_times[i], noise=noise, *args, **kwargs) for i in range(self.PBar.N)])
+        peak_times, heights = rng.normal(scale=pts, size=n) + pt, landau_sample(mpv, w, n, rng).clip(max=500)
+        values = array([self._get_model_data(i, model, cft, heights[i], peak_times[i], noise=noise, *args, **kwargs) for i in range(self.PBar.N)])
         self.PBar.finish()
         f = h5py.File(hdf5_path, 'w')
         f.create_dataset('times', data=values[:, 0].astype('f2'))
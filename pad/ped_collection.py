@@ -27,14 +27,33 @@ class PedCollection(SubCollection):
     def get_pickle_path(self, name='', suf='', sub_dir=None, dut=None, camp=None):
         return super().get_pickle_path(name, suf, 'Pedestal', dut, camp)
 
-    def noise(self, avrg=False, flux_sort=False, runs=None, redo=False):
-        return self.get_values('noise', PedestalAnalysis.get_noise, runs, None, avrg, self.get_pickle_path(), flux_sort, redo=redo)
+    def estimates(self, flux_sort=False, runs=None, redo=False):
+        """ :returns: batched pedestal mean and sigma of all regions with shape (runs, regions, 2), the uncached runs are evaluated in a process pool """
+        return self.get_values('pedestal estimates', PedestalAnalysis.get_estimates, runs, None, False, self.get_pickle_path('Est'), flux_sort, parallel=True, _redo=redo)
 
-    def mean(self, avrg=False, flux_sort=False, runs=None, err=True, redo=False):
-        x = self.get_values('mean', PedestalAnalysis.get_mean, runs, None, False, self.get_pickle_path(), flux_sort, redo=redo)
+    def get_estimate(self, par=0, avrg=False, flux_sort=False, runs=None, redo=False):
+        x = self.estimates(flux_sort, runs, redo)[:, self.get_analyses()[0].get_region_index(), par]
+        return self.Ana.get_flux_average(x) if avrg else x
+
+    def noise(self, avrg=False, flux_sort=False, runs=None, redo=False, fit=False):
+        if fit:
+            return self.get_values('noise', PedestalAnalysis.get_noise, runs, None, avrg, self.get_pickle_path(), flux_sort, redo=redo)
+        return self.get_estimate(1, avrg, flux_sort, runs, redo)
+
+    def mean(self, avrg=False, flux_sort=False, runs=None, err=True, redo=False, fit=False):
+        if fit:
+            x = self.get_values('mean', PedestalAnalysis.get_mean, runs, None, False, self.get_pickle_path(), flux_sort, redo=redo)
+        else:
+            x = self.get_estimate(0, False, flux_sort, runs, redo)
         x = add_err(x, PedCollection.ErrSys if err else 0)  # add sys error to all runs
         return self.Ana.get_flux_average(x) if avrg else x
 
+    def compare_fits(self, runs=None):
+        """ cross-check the batched estimates with the ROOT fits of all runs. """
+        m0, m1 = [uarr2n(self.mean(runs=runs, err=False, fit=fit)) for fit in [True, False]]
+        s0, s1 = [uarr2n(self.noise(runs=runs, fit=fit)) for fit in [True, False]]
+        self.info(f'max deviation of the estimates from the fits: mean {abs(m1 - m0).max():.3f} mV, noise {abs(s1 - s0).max():.3f} mV')
+
     def spread(self, avrg=True):
         x = self.mean(avrg)
         return max(x) - min(x)
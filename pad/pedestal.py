@@ -8,7 +8,7 @@ from numpy import log
 
 from src.sub_analysis import PadSubAnalysis
 from plotting.save import *
-from helpers.utils import save_pickle, binned_stats
+from helpers.utils import save_pickle, bin_stats, save_result, gauss_pars
 
 
 class PedestalAnalysis(PadSubAnalysis):
@@ -53,6 +53,24 @@ class PedestalAnalysis(PadSubAnalysis):
     def get_fit(self, name=None, bin_scale=None, cut=None, _redo=False):
         return self.draw_dist_fit(name, bin_scale, cut, _redo, show=False, prnt=False)
 
+    def get_region_index(self, name=None):
+        return list(self.get_all_signal_names()).index(choose(name, self.SignalName))
+
+    @save_pickle('Est', suf_args='all')
+    def get_estimates(self, cut=None, _redo=False):
+        """ :returns: robust Gaussian mean and sigma of all pedestal regions with shape (n_regions, 2), read from the tree in a single query """
+        self.Run.set_estimate()
+        return gauss_pars(self.get_tree_vec([self.get_signal_var(name) for name in self.get_all_signal_names()], self.Cut(cut)))
+
+    def get_estimate(self, name=None, cut=None, redo=False):
+        return self.get_estimates(cut, _redo=redo)[self.get_region_index(name)]
+
+    def compare_fits(self, cut=None, redo=False):
+        """ cross-check the batched estimates of all regions with the single ROOT fits. """
+        for name, e in zip(self.get_all_signal_names(), self.get_estimates(cut, _redo=redo)):
+            f = self.get_fit(name, cut=cut, _redo=redo)[1:3]
+            self.info(f'{self.get_short_name(name):>6}: fit {f[0]:.2f}, {f[1]:.2f}, estimate {e[0]:.2f}, {e[1]:.2f} mV')
+
     def get(self, par=1, name=None, bin_scale=None, cut=None, redo=False):
         return self.get_fit(name, bin_scale, cut, _redo=redo)[par]
 
@@ -71,7 +89,7 @@ class PedestalAnalysis(PadSubAnalysis):
     def get_raw_noise(self, cut=None, redo=False):
         return self.get_noise(self.RawName, 5, cut, redo)
 
-    @save_pickle('SigPed')
+    @save_result('SigPed')
     def _get_under_signal(self, _redo=False):
         return FitRes(self.draw_under_signal(show=False, prnt=False).Fit('gaus', 'qs'))
 
@@ -84,10 +102,9 @@ class PedestalAnalysis(PadSubAnalysis):
     # region DRAW
     def draw_map(self, res=None, fid=False, cut=None, show=True):
         cut = self.Cut.generate_custom(exclude=['fiducial'], prnt=False) if not fid and cut is None else self.Cut(cut)
-        h0 = self.Draw.prof2d(*self.get_tree_vec(self.Ana.get_track_vars() + [self.get_signal_var()], self.Cut()), self.Bins.get_global(res), show=False)
-        fid_vals = [h0.GetBinContent(ibin) for ibin in range(h0.GetNbinsY() * h0.GetNbinsX()) if h0.GetBinEntries(ibin) > 20]
-        v = self.get_tree_vec(self.Ana.get_track_vars() + [self.get_signal_var()], cut)
-        self.Draw.prof2d(*v, self.Bins.get_global(res), 'Pedestal Map', show=show, z_range=ax_range(fid_vals, 0))
+        p0, p = [self.Ana.get_binned_map(self.get_signal_var(), self.Bins.get_global(res), c, 'Ped') for c in [self.Cut(), cut]]
+        fid_vals = p0.mean[p0.Counts > 20]
+        self.Draw.prof2d(p.make_prof2d('Pedestal Map'), show=show, z_range=ax_range(fid_vals, 0))
         self.Cut.draw_fid()
         update_canvas()
         return fid_vals
@@ -163,7 +180,7 @@ class PedestalAnalysis(PadSubAnalysis):
     @save_pickle('Trend', suf_args='all')
     def get_trend(self, signal_name=None, bin_size=None, sigma=False, cut=None, _redo=False):
         (x, y), b = self.get_tree_vec(var=[self.get_t_var(), self.get_signal_var(signal_name)], cut=self.Cut(cut)), self.Bins.get_time(bin_size)[-1]
-        x, y = b[:-1] + diff(b) / 2, binned_stats(x, y, mean_sigma, b)[:, 1 if sigma else 0]
+        x, y = b[:-1] + diff(b) / 2, bin_stats(x, y, b).get_values(sigma)
         name = 'Sigma' if sigma else 'Pedestal'
         return self.Draw.graph(x, y, title=f'{name} Trend', y_tit=f'{name} [mV]', show=False)
 
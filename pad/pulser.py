@@ -5,7 +5,7 @@
 from pad.waveform import Waveform
 from src.sub_analysis import PadSubAnalysis
 from plotting.save import *
-from helpers.utils import do_pickle, partial, fit2u, save_pickle
+from helpers.utils import do_pickle, partial, fit2u, save_pickle, save_result
 
 
 class PulserAnalysis(PadSubAnalysis):
@@ -158,10 +158,11 @@ class PulserAnalysis(PadSubAnalysis):
 
     @save_pickle('PulserPulseHeight', suf_args='all')
     def get_pulse_height_trend(self, bin_size=None, cut=None, _redo=False):
-        x, y = self.get_tree_vec(var=[self.get_t_var(), self.get_signal_var()], cut=self.Cut(cut))
+        """ :returns: graph of the pulser pulse height in time bins of [bin_size] events """
         m, s = self.get_mean_sigma(cut)
-        ph_cut = (m - 4 * s < y) & (y < m + 4 * s)
-        return self.Draw.profile(x[ph_cut], y[ph_cut], self.Bins.get_time(bin_size, cut), 'Pulser Pulse Height', show=False, graph=True, markersize=.7)
+        y_range = tuple(round(v.n, 1) for v in [m - 4 * s, m + 4 * s])  # rounded, since it is part of the file name
+        p = self.Ana.get_binned_trend(self.get_signal_var(), 'Pulser', self.Bins.get_time(bin_size, cut), y_range, self.Cut(cut), _redo)
+        return self.Ana.make_trend_graph(p, 'Pulser Pulse Height', markersize=.7)
 
     def draw_pulse_height(self, bin_size=None, cut=None, redo=False, **kwargs):
         """ Shows the average pulse height of the pulser as a function of time """
@@ -192,7 +193,7 @@ class PulserAnalysis(PadSubAnalysis):
             return get_fwhm(h, ret_edges=True, err=False)
         return uarr2n([f0[1] + i * f0[2] for i in ([-lsig, rsig] if same_polarity else [-rsig, lsig])])  # fit left tail if same pol and right tail otherwise
 
-    @save_pickle('Fit', suf_args='all')
+    @save_result('Fit', suf_args='all')
     def get_distribution_fit(self, corr=True, beam_on=True, bw=None, _redo=False):
         h = self.get_distribution(corr=corr, beam_on=beam_on, bw=bw, _redo=_redo)
         fit = FitRes(h.Fit('gaus', 'qs0', '', *self.get_fit_range(h)))
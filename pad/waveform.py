@@ -7,7 +7,10 @@ from ROOT import TCut, TMultiGraph
 from numpy import fft, argmax, sum
 from src.sub_analysis import PadSubAnalysis
 from plotting.draw import *
-from helpers.utils import do_pickle, save_hdf5, cpu_count, Pool, PBar, get_tree_vec, do_hdf5, interpolate_y, update_pbar
+from helpers.utils import do_pickle, save_hdf5, cpu_count, Pool, PBar, get_tree_vec, do_hdf5, interpolate_y, update_pbar, SharedArray, ScaledDataset, h5py, remove_file, make_byte_string, time, join
+from numpy.random import default_rng
+from os.path import getsize
+from tempfile import gettempdir
 from plotting.fit import ErfLand
 
 
@@ -58,25 +61,55 @@ class Waveform(PadSubAnalysis):
     def get(self, i):
         return self.get_all()[i]
 
-    @save_hdf5()
+    @save_hdf5('I16', compression='lzf')
     def get_all(self, _redo=False):
-        """ extracts all dut waveforms after all cuts from the root tree and saves it as a hdf5 file """
-        with Pool() as pool:
+        """ extracts all dut waveforms after all cuts from the root tree and saves them as compressed int16 values with a scale and offset of the run in a hdf5 file.
+            The workers write into a shared block instead of sending back their waveforms. """
+        with Pool() as pool, SharedArray((self.Run.NEvents, self.NSamples), 'f4') as wf:
             self.info('Saving signal waveforms to hdf5 ...')
-            result = pool.starmap(self._get_all, [(i, ) for i in array_split(arange(self.Run.NEvents), cpu_count())])
-            return concatenate(result)
+            pool.starmap(self._get_all, [(i, None, wf) for i in array_split(arange(self.Run.NEvents), cpu_count())])
+            return wf.Array.copy()
 
-    def _get_all(self, ind, ch=None):
+    def _get_all(self, ind, ch=None, out=None):
         var = f'{"-" if self.Ana.Polarity < 0 else ""}wf{choose(ch, self.Channel)}'
         tree, pbar = self.Run.load_rootfile(False), PBar(ind.size) if not ind[0] else None
-        return array([self.get_from_tree(tree, ev, var, pbar) for ev in ind])
+        values = array([self.get_from_tree(tree, ev, var, pbar) for ev in ind])
+        if out is None:
+            return values
+        out.Array[ind] = values
 
     @staticmethod
     def get_from_tree(t, ev, var, pbar=None):
         if pbar is not None:
             if ev % 1000:
                 pbar.update(ev)
-        return get_tree_vec(t, var, '', 'f2', 1, ev)
+        return get_tree_vec(t, var, '', 'f4', 1, ev)
+
+    def compare_formats(self, n=10000, n_random=1000):
+        """ compare file size and read speed of the float16 layout with the compressed int16 layouts for the first [n] waveforms.
+            :returns: max deviation of the read back waveforms from the tree values for every layout (0 for a lossless round trip) """
+        data, rng, dev = self._get_all(arange(min(n, self.Run.NEvents))), default_rng(), {}
+        layouts = {'float16': lambda f: f.create_dataset('data', data=data.astype('f2')), 'int16-lzf': lambda f: ScaledDataset.create(f, data, compression='lzf'),
+                   'int16-gzip': lambda f: ScaledDataset.create(f, data, compression='gzip')}
+        for name, create in layouts.items():
+            file_path = join(gettempdir(), f'wf-{name}.hdf5')
+            with h5py.File(file_path, 'w') as f:
+                create(f)
+            with h5py.File(file_path, 'r') as f:
+                ds = ScaledDataset(f['data']) if 'scale' in f['data'].attrs else f['data']
+                t0 = time()
+                values = array(ds)
+                t1 = time()
+                for i in rng.integers(0, data.shape[0], n_random):
+                    ds[i]
+                t2 = time()
+                ds[:, self.NSamples // 2]
+                t3 = time()
+            dev[name] = abs(values.astype('d') - data).max()
+            self.info(f'{name:>10}: {make_byte_string(getsize(file_path)):>9}, sequential {data.shape[0] / (t1 - t0):.2e} wf/s, random {n_random / (t2 - t1):.2e} wf/s, '
+                      f'single sample {(t3 - t2) * 1e3:.1f} ms, max deviation {dev[name]:.2e} mV')
+            remove_file(file_path, prnt=False)
+        return dev
 
     def get_values(self, cut=None, n=None):
         cut = self.get_cut(cut, n)
@@ -84,7 +84,7 @@ class PixAnalysis(DUTAnalysis):
     def get_tp_vars():
         return [PixAnalysis.get_tp_var(dut=True), PixAnalysis.get_tp_var(dut=False)]
 
-    @save_pickle('Fit', sub_dir='PH', suf_args='all')
+    @save_result('Fit', sub_dir='PH', suf_args='all')
     def _get_pulse_height(self, bin_size=None, cut=None, _redo=False):
         return self.draw_pulse_height(bin_size, cut, show=False)[1][0]
 
@@ -4,10 +4,12 @@
 # created on August 2nd 2021 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
-from helpers.utils import join, file_exists, save_pickle, choose, prep_kw, deepcopy, warning, is_iter
+from helpers.utils import join, file_exists, save_pickle, choose, prep_kw, deepcopy, warning, is_iter, time
 from plotting.draw import FitRes, Draw
 from plotting.fit import Erf
-from numpy import genfromtxt, arange, array, concatenate, full
+from numpy import genfromtxt, arange, array, concatenate, full, where, errstate, count_nonzero, meshgrid
+from numpy.random import randint
+from scipy.special import erf, erfinv
 from src.sub_analysis import SubAnalysis
 from src.dut import Plane
 
@@ -88,6 +90,10 @@ class Calibration(SubAnalysis):
         self.set_parameters(col, row)
         return self.Fit(vcal)
 
+    def get_pars(self, col, row, plane=None):
+        """:returns: fit parameters (x0, width, offset, scale) of the given pixels with shape (4, n) """
+        return self.Parameters[choose(plane, self.N), col, row].T
+
     def get_chi2(self, col, row):
         x, y = self.get_points(col, row, zero_sup=True)
         self.set_parameters(col, row)
@@ -95,22 +101,44 @@ class Calibration(SubAnalysis):
 
     @save_pickle('Chi2s', run='TelescopeID')
     def get_chi2s(self, _redo=False):
-        return array([[self.get_chi2(col, row) for row in range(Plane.NRows)] for col in range(Plane.NCols)])
+        x, y, (x0, w, off, scale) = self.get_x(), self.Points[self.N], self.Parameters[self.N].transpose(2, 0, 1)[..., None]
+        n, dof = count_nonzero(y, axis=2), count_nonzero(y, axis=2) - 4
+        chi2 = ((y - scale * (erf((x - x0) / w) + off)) ** 2 * (y != 0)).sum(axis=2) / where(dof > 0, dof, 1)  # DOF = array size - 4 fit pars
+        return where(n < 4, 999, chi2)
 
     def get_threshold(self, col, row, vcal=True):
         thresh = self.get_vcal(col, row, 0)
         return thresh if thresh == -999 else thresh * (self.Bins.Vcal2Ke if not vcal else 1)
 
     def get_thresholds(self, cols=None, rows=None, pix=None, vcal=True):
-        cols, rows = self.Cut.get_fid_lines(cols, rows, pix)
-        return array([[col, row, self.get_threshold(col, row, vcal)] for col in cols for row in rows if self.get_threshold(col, row, vcal) != -999])
+        cols, rows = [i.flatten() for i in meshgrid(*self.Cut.get_fid_lines(cols, rows, pix), indexing='ij')]
+        thresh = self.get_vcals(cols, rows, 0)
+        cut = thresh != -999
+        return array([cols[cut], rows[cut], thresh[cut] * (self.Bins.Vcal2Ke if not vcal else 1)]).T
 
     def get_vcals(self, col, row, adc):
-        return array([self.get_vcal(col[i], row[i], adc[i]) for i in range(col.size)])
+        """ analytical inversion of the erf calibration for all hits at once. Same result as :meth:`get_vcal`, which uses TF1.GetX. """
+        x0, w, off, scale = self.get_pars(col, row)
+        y = array(adc, 'd') / scale - off
+        with errstate(invalid='ignore'):
+            v = (x0 + w * erfinv(y)).clip(self.Fit.GetXmin(), self.Fit.GetXmax())
+        return where((off - 1) * scale > adc - 1, -999, where(y >= 1, self.Fit.GetXmax(), v))  # no solution above the maximum -> GetX returns the upper edge
 
     def get_adcs(self, col, row, vcal):
+        x0, w, off, scale = self.get_pars(col, row)
         vcal = vcal if is_iter(vcal) else full(col.size, vcal)
-        return array([self.get_vcal(col[i], row[i], vcal[i]) for i in range(col.size)])
+        return scale * (erf((vcal - x0) / w) + off)
+
+    def compare_vcals(self, n=10000):
+        """ compare the analytical with the TF1 inversion for [n] random hits and measure the hit rates. """
+        col, row, adc = [randint(0, m, n) for m in [Plane.NCols, Plane.NRows, 256]]
+        t0 = time()
+        v0 = array([self.get_vcal(*i) for i in zip(col, row, adc)])
+        t1 = time()
+        v1 = self.get_vcals(col, row, adc)
+        t2 = time()
+        self.info(f'TF1: {n / (t1 - t0):.0f} hits/s, analytical: {n / (t2 - t1):.0f} hits/s, max deviation: {abs(v0 - v1).max():.2e}')
+        return v0, v1
 
     def get_min(self, col, row):
         _, _, off, scale = self.Parameters[self.N, col, row]
@@ -46,9 +46,9 @@ class Efficiency(PixAnalysis):
 
     @save_pickle('Map', suf_args='all', verbose=True)
     def get_map(self, res=None, fid=False, cut=None, local=False, _redo=False):
-        x, y, zz = self.get_tree_vec(self.get_track_vars(local=local) + [self.get_var()], self.Cut(cut) if cut or fid else self.Cut.exclude('fiducial'))
-        tit, (xtit, ytit), ztit = 'Efficiency Map', [f'Track Position {i} [mm]' for i in ['X', 'Y']], 'Efficiency [%]'
-        return self.Draw.prof2d(x, y, zz * 100, Bins.get_global(res), tit, x_tit=xtit, y_tit=ytit, z_tit=ztit, show=False)
+        p = self.get_binned_map(self.get_var(percent=True), Bins.get_global(res), self.Cut(cut) if cut or fid else self.Cut.exclude('fiducial'), f'Eff{int(self.UseRhit)}', local, _redo)
+        (xtit, ytit), ztit = [f'Track Position {i} [mm]' for i in ['X', 'Y']], 'Efficiency [%]'
+        return self.Draw.prof2d(p.make_prof2d('Efficiency Map'), x_tit=xtit, y_tit=ytit, z_tit=ztit, show=False)
 
     def draw_map(self, res=None, fid=False, cut=None, local=False, redo=False, **dkw):
         return self.Draw(self.get_map(res, fid, cut, local, _redo=redo), **prep_kw(dkw, leg=self.Cut.get_fid(), file_name='EfficiencyMap'))
@@ -4,9 +4,10 @@
 # created on August 2nd 2021 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
-from ROOT import gRandom
-from helpers.utils import deepcopy, arange, array, mean
+from ROOT import gRandom, gROOT, TProfile2D, TCutG, TF1
+from helpers.utils import deepcopy, arange, array, mean, landau_sample, default_rng, where, zeros, full
 from plotting.draw import format_statbox, format_histo, Draw
+from numpy import meshgrid, searchsorted, bincount, nan, nanargmin, unravel_index, inf
 from numpy.random import randint
 from src.sub_analysis import SubAnalysis
 from src.dut import Plane
@@ -14,33 +15,51 @@ from src.dut import Plane
 
 class HighThresh(SubAnalysis):
 
+    Thresholds = [47 * i for i in [150, 160, 170]]
+
     def __init__(self, pix_analysis):
         super().__init__(pix_analysis, pickle_dir='HighThresh')
 
-    def find_landau(self, aver=10, m1=2500, m2=5000, s1=500, s2=1600):
-        seed = self.Ana.draw_signal_distribution(show=False)
-        h = deepcopy(seed)
-        m_range = range(m1, m2 + 1, 100)
-        s_range = range(s1, s2 + 1, 50)
-        p = TProfile2D('g_fl', 'Find Landau', len(m_range) - 1, m_range[0], m_range[-1], len(s_range) - 1, s_range[0], s_range[-1])
-        self.PBar.start(len(m_range) * len(s_range) * aver)
-        i = 0
-        r_min, r_max = .5, 1.5
-        for _ in range(aver):
-            for m in m_range:
-                for s in s_range:
-                    i += 1
-                    self.PBar.update(i)
-                    if r_min < m / 4. / s < r_max:
-                        delta = self.model_landau(seed, h, m, s, show=False, thresh=True)
-                        p.Fill(m, s, delta)
-        self.PBar.finish()
+    def find_landau(self, aver=10, m1=2500, m2=5000, s1=500, s2=1600, r_min=.5, r_max=1.5, max_size=1e7, seed=None):
+        h = self.Ana.draw_signal_distribution(show=False)
+        m_range, s_range = arange(m1, m2 + 1, 100), arange(s1, s2 + 1, 50)
+        n = h.GetNbinsX()  # same bins as model_landau: underflow and bins 1 to n - 1
+        x, y = array([-inf] + [h.GetBinLowEdge(i) for i in range(1, n + 1)]), array([h.GetBinContent(i) for i in range(n)])
+        chi2 = self.calc_landau_chi2s(x, y, m_range, s_range, int(h.GetEntries()), aver, r_min, r_max, self.Thresholds, max_size, seed)
+        p = TProfile2D('g_fl', 'Find Landau', m_range.size - 1, m_range[0], m_range[-1], s_range.size - 1, s_range[0], s_range[-1])
+        for (i, j), delta in zip(((i, j) for i in range(m_range.size) for j in range(s_range.size)), chi2.flatten()):
+            p.Fill(m_range[i], s_range[j], delta) if delta == delta else None  # skip nan
         format_statbox(h, entries=True, x2=.82)
         format_histo(p, x_tit='MPV [e]', y_tit='Sigma [e]', z_tit='#chi^{2} to Seed Function', y_off=1.7, z_off=1.3)
         self.Draw(p, draw_opt='colz', lm=.13, rm=0.16)
         self.draw_ms_ratios(r_min, r_max, m1, m2, s1, s2)
         self.Draw.save_plots('FindLandau')
         self.find_working_point(p)
+        i, j = unravel_index(nanargmin(chi2), chi2.shape)
+        return m_range[i], s_range[j], chi2
+
+    @staticmethod
+    def calc_landau_chi2s(x, y, m, s, n, aver=10, r_min=.5, r_max=1.5, thresholds=None, max_size=1e7, rng=None):
+        """ simulate [n] Landau values for every combination of MPV [m] and sigma [s] and compare them to the distribution with bin edges [x] and contents [y].
+            The same standard Landau values are scaled for all combinations, so the result does not depend on the chunk size of max [max_size] values.
+            The bin containing 0 is excluded, [x] may start with -inf to include the underflow.
+            :returns: mean squared bin deviation with shape (m.size, s.size), nan outside of the ratio range [r_min, r_max] """
+        rng, (mm, ss) = default_rng(rng), meshgrid(m, s, indexing='ij')
+        cut = (r_min < mm / 4 / ss) & (mm / 4 / ss < r_max)
+        mm, ss, nb = mm[cut].reshape(-1, 1), ss[cut].reshape(-1, 1), y.size
+        ibins = arange(nb) != searchsorted(x, 0, side='right') - 1  # exclude the zero bin
+        chunk, deltas = max(1, int(max_size // n)), zeros(mm.size)
+        for _ in range(aver):
+            lan, th = landau_sample(0, 1, n, rng), full(n, -1e9) if thresholds is None else rng.choice(thresholds, n)
+            for i in range(0, mm.size, chunk):
+                v = mm[i:i + chunk] + ss[i:i + chunk] * lan
+                v = where(v > th, v, 0) if thresholds is not None else v
+                b = searchsorted(x, v, side='right') - 1
+                k = (arange(v.shape[0]).reshape(-1, 1) * nb + b)[(b >= 0) & (b < nb)]
+                deltas[i:i + chunk] += mean((bincount(k, minlength=v.shape[0] * nb).reshape(-1, nb) - y)[:, ibins] ** 2, axis=1)
+        chi2 = full(cut.shape, nan)
+        chi2[cut] = deltas / aver
+        return chi2
 
     @staticmethod
     def draw_ms_ratios(r_min, r_max, m1, m2, s1, s2, step=.1):
@@ -1,4 +1,5 @@
-from numpy import zeros, array
+from numpy import zeros, array, pad, where
+from numpy.lib.stride_tricks import sliding_window_view
 from ROOT import TH2F, TCanvas, TExec
 
 __author__ = 'micha'
@@ -9,6 +10,8 @@ __author__ = 'micha'
 # ==============================================
 class Extrema2D:
 
+    LineIndices = {'horizontal': [(0, 1), (1, 1), (2, 1)], 'vertical': [(1, 0), (1, 1), (1, 2)], 'swne': [(0, 0), (1, 1), (2, 2)], 'nwse': [(0, 2), (1, 1), (2, 0)]}  # (col, row) in the 3x3 window
+
     def __init__(self, signal_histo, mean_histo):
         self.SignalHisto = signal_histo
         self.MeanHisto = mean_histo
@@ -16,6 +19,7 @@ class Extrema2D:
         # attributes
         self.rows = self.SignalHisto.GetNbinsY() + 2
         self.cols = self.SignalHisto.GetNbinsX() + 2
+        self.Values = self.get_values()
         # new histograms
         self.VotingHistos = self.create_voting_histo()
         self.canvas = None
@@ -27,21 +31,59 @@ class Extrema2D:
         nq = len(xq)
         thresh = zeros(nq)
         self.MeanHisto.GetQuantiles(nq, thresh, xq)
-        dic['min'] = thresh[:(nq / 2)]
-        dic['max'] = thresh[(-nq / 2):]
+        dic['min'] = thresh[:(nq // 2)]
+        dic['max'] = thresh[(-nq // 2):]
         return dic
 
-    def horizontal_scan(self):
+    def get_values(self):
+        """:returns: bin contents including under- and overflow with shape (cols, rows), so that [col, row] are the bin numbers """
+        return array([self.SignalHisto.GetBinContent(i) for i in range(self.SignalHisto.GetSize())]).reshape(self.rows, self.cols).T
+
+    @staticmethod
+    def get_windows(values, size=1):
+        """:returns: view of the (2 * size + 1)² neighbourhood of every bin with shape (cols, rows, n, n). The edge bins are repeated, like GetBinContent does outside of the histogram. """
+        return sliding_window_view(pad(values, size, mode='edge'), (2 * size + 1,) * 2)
+
+    def add_votes(self, votes, histos=None):
+        histos = self.VotingHistos if histos is None else histos
+        for name, v in votes.items():
+            for col, row in array(where(v)).T:
+                histos[name].SetBinContent(int(col), int(row), histos[name].GetBinContent(int(col), int(row)) + v[col, row])
+        return histos
+
+    def calc_line_votes(self, mode):
+        """ vectorised version of :meth:`__add_local_extrema` for all bins at once. """
+        w = self.get_windows(self.Values)
+        start, center, end = [w[..., i, j] for i, j in self.LineIndices[mode]]
+        is_max = (start <= center) & (center >= end) & (center > self.Thresholds['max'][0])
+        return {'max': is_max, 'min': ~is_max & (start >= center) & (center <= end) & (center < self.Thresholds['min'][-1])}
+
+    def calc_region_votes(self):
+        return {'max': (self.Values[..., None] > self.Thresholds['max']).sum(axis=-1), 'min': (self.Values[..., None] < self.Thresholds['min']).sum(axis=-1)}
+
+    def calc_square_votes(self, size=1):
+        w, inner = self.get_windows(self.Values, size), zeros(self.Values.shape, '?')
+        inner[1:-1, 1:-1] = True
+        is_max = (w.max(axis=(-2, -1)) == self.Values) & (self.Values > self.Thresholds['max'][0]) & inner
+        return {'max': is_max, 'min': ~is_max & (w.min(axis=(-2, -1)) == self.Values) & (self.Values < self.Thresholds['min'][-1]) & inner}
+
+    def horizontal_scan(self, vec=False):
+        if vec:
+            return self.add_votes(self.calc_line_votes('horizontal'))
         for row in range(self.rows):
             for col in range(self.cols):
                 self.__add_local_extrema(col, row, mode='horizontal')
 
-    def vertical_scan(self):
+    def vertical_scan(self, vec=False):
+        if vec:
+            return self.add_votes(self.calc_line_votes('vertical'))
         for col in range(self.cols):
             for row in range(self.rows):
                 self.__add_local_extrema(col, row, mode='vertical')
 
-    def sw_ne_scan(self):
+    def sw_ne_scan(self, vec=False):
+        if vec:  # includes the two corner bins, which are not reached by the diagonals below
+            return self.add_votes(self.calc_line_votes('swne'))
         rows = [row for row in range(self.rows - 2, 0, -1)]
         cols = [0] * (self.rows - 2)
         rows += [0] * (self.cols - 1)
@@ -52,7 +94,9 @@ class Extrema2D:
                 row += 1
                 col += 1
 
-    def nw_se_scan(self):
+    def nw_se_scan(self, vec=False):
+        if vec:
+            return self.add_votes(self.calc_line_votes('nwse'))
         rows = [row for row in range(1, self.rows - 1)]
         cols = [0] * (self.rows - 2)
         print(len(rows), len(cols))
@@ -67,14 +111,16 @@ class Extrema2D:
                 col += 1
             print()
 
-    def make_all_line_scans(self):
-        self.horizontal_scan()
-        self.vertical_scan()
+    def make_all_line_scans(self, vec=False):
+        self.horizontal_scan(vec)
+        self.vertical_scan(vec)
         # self.sw_ne_scan()
         # self.nw_se_scan()
         self.show_voting_histos()
 
-    def region_scan(self):
+    def region_scan(self, vec=False):
+        if vec:
+            return self.add_votes(self.calc_region_votes())
         for col in range(self.cols):
             for row in range(self.rows):
                 for threshold in self.Thresholds['max']:
@@ -86,8 +132,11 @@ class Extrema2D:
                         old_content = self.VotingHistos['min'].GetBinContent(col, row)
                         self.VotingHistos['min'].SetBinContent(col, row, old_content + 1)
 
-    def square_scan(self, size=1, histo=None):
+    def square_scan(self, size=1, histo=None, vec=False):
         fill_histos = self.VotingHistos if histo is None else histo
+        if vec:
+            self.VotingHistos = self.add_votes(self.calc_square_votes(size), fill_histos)
+            return
         rows = [i for i in range(-size, size + 1)] * (2 * size + 1)
         cols = sorted(rows)
         for col in range(1, self.cols - 1):
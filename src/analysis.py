@@ -146,14 +146,33 @@ class Analysis(object):
         return sel_files + rp_files + [f for run in runs for f in (self.PickleDir if all_ else self.PickleSubDir).rglob(f'*{self.TCString}_{run}{dut_nr}*')]
 
     def remove_metadata(self, all_subdirs=False):
-        for f in self.get_meta_files(all_subdirs):
+        files = self.get_meta_files(all_subdirs)
+        for f in files:
             remove_file(f)
+        self.CacheIndex.remove(files)
 
     def remove_tc_metadata(self):
         files = glob(join(self.PickleDir, '*', f'*{self.TCString}*'))
         info(f'removing {len(files)} meta files with a total size of {make_byte_string(sum(getsize(f) for f in files))}')
-        for f in glob(join(self.PickleDir, '*', f'*{self.TCString}*')):
+        for f in files:
             remove_file(f, prnt=False)
+        self.CacheIndex.remove(files)
+
+    @property
+    def CacheIndex(self):
+        return CacheIndex.from_dir(self.PickleDir)
+
+    def is_cached(self, paths):
+        """ check the index first and only look at the files, which are not in there """
+        return all(file_exists(p) for p in set(map(str, paths)) - self.CacheIndex.existing(paths))
+
+    def load_cached(self, paths):
+        """ :returns: the values of the cached [paths] or None if one of them is missing. Index rows of files, which were deleted outside of the index, are removed. """
+        if self.is_cached(paths):
+            try:
+                return [load_pickle(p) for p in paths]
+            except FileNotFoundError:
+                self.CacheIndex.remove([p for p in paths if not file_exists(p)])
 
     def get_metadata_size(self, all_subdirs=True):
         info('total size of metadata: {}'.format(make_byte_string(sum(getsize(f) for f in self.get_meta_files(all_subdirs)))))
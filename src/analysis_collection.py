@@ -128,8 +128,10 @@ class AnalysisCollection(Analysis):
 
     @quiet
     def save_data(self):
-        for i, data in enumerate(self.parallel(self.Analysis.get_data)):
-            self.Analyses[i].save_data(data)
+        if self.Draw.mount_exists:
+            with H5Writer(join(self.Draw.ServerMountDir, 'data', 'data.hdf5')) as w:
+                for i, data in enumerate(self.parallel(self.Analysis.get_data)):
+                    self.Analyses[i].save_data(data, w)
 
     @quiet
     def save_coll_plots(self, prnt=True):
@@ -240,6 +242,12 @@ class AnalysisCollection(Analysis):
     def get_analyses(self, runs=None):
         return self.Analyses if runs is None else [ana for ana in self.Analyses if ana.Run.Number in runs]
 
+    def prefetch(self, anas=None, depth=None, max_size=None):
+        """ iterate over the analyses, while the root file and the cached files of the next runs are read in the background.
+            Only useful for serial loops, :meth:`parallel` hands all runs to the pool at once. """
+        depth, max_size = choose(depth, self.MainConfig.get_value('SAVE', 'prefetch depth', default=1)), choose(max_size, self.MainConfig.get_value('SAVE', 'prefetch size', default=2e9))
+        return Prefetcher(choose(anas, self.Analyses), lambda ana: [ana.Run.RootFilePath] + ana.get_meta_files(), depth, max_size)
+
     def get_hv_name(self):
         return self.Currents.Name
 
@@ -247,9 +255,8 @@ class AnalysisCollection(Analysis):
     def get_values(self, what, f, runs=None, pbar=True, avrg=False, picklepath=None, flux_sort=False, plots=False, **kwargs):
         runs = choose(runs, self.Runs)
         redo = 'redo' in kwargs and kwargs['redo'] or '_redo' in kwargs and kwargs['_redo']
-        if picklepath is not None and all([file_exists(picklepath.format(run)) for run in runs]) and not redo:
-            values = [load_pickle(picklepath.format(run)) for run in runs]
-        else:
+        values = None if picklepath is None or redo else self.load_cached([picklepath.format(run) for run in runs])
+        if values is None:
             self.info(f'Generating {what} ...', prnt=pbar)
             values = self.parallel(f, runs=runs, pbar=pbar, **kwargs)
         return values if plots else array(self.get_flux_average(array(values))) if avrg else array(values, dtype=object)[self.get_fluxes().argsort() if flux_sort else ...]
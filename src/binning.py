@@ -6,7 +6,8 @@
 
 from plotting.draw import remove_file
 from plotting.binning import *
-from helpers.utils import load_main_config, save_pickle
+from numpy import ceil, array_equal
+from helpers.utils import load_main_config, save_pickle, time
 from src.dut import Plane
 from src.sub_analysis import SubAnalysis
 
@@ -15,6 +16,8 @@ class Bins(SubAnalysis):
 
     Config = load_main_config()
     Size = Config.get_value('PLOTS', 'bin size', int)
+    FineTime = Config.get_value('PLOTS', 'fine time bin', default=1.)  # seconds
+    FineRes = Plane.R0 / Config.get_value('PLOTS', 'fine map division', default=4)
     FluxRange = Config.get_list('PLOTS', 'flux range')
     FluenceRange = Config.get_list('PLOTS', 'fluence range')
 
@@ -61,14 +64,32 @@ class Bins(SubAnalysis):
     def remove_pickle(self, bin_size=None):
         remove_file(self.make_simple_pickle_path(suf=choose(bin_size, '')))
 
+    def get_events(self, bin_size=None, cut=None):
+        """ :returns: event numbers at the edges of the bins with [bin_size] events of the [cut], sliced from the cached event list of the cut """
+        return self.make_event_bins(self.Ana.get_events(cut), bin_size)
+
     @save_pickle(suf_args='[0, 1]', print_dur=True)
-    def get_events(self, bin_size=None, cut=None, _redo=False):
+    def get_tree_events(self, bin_size=None, cut=None, _redo=False):
         self.Tree.SetEstimate(self.Run.NEvents)
-        events = self.get_tree_vec('Entry$', self.Cut(cut), 'i4')
-        b = events[::self.get_size(bin_size)]
-        bins = append(b, events[-1] if events[events > b[-1]].size > self.get_size(bin_size) / 4 or b.size == 1 else [])
+        return self.make_event_bins(self.get_tree_vec('Entry$', self.Cut(cut), 'i4'), bin_size)
+
+    @staticmethod
+    def make_event_bins(events, bin_size=None):
+        w = Bins.get_size(bin_size)
+        b = events[::w]
+        bins = append(b, events[-1] if (events.size - 1) % w > w / 4 or b.size == 1 else [])
         return [bins.size - 1, array(bins, 'd')]
 
+    def compare_events(self, bin_sizes=(1000, 5000, 10000), cut=None):
+        """ compare the bin edges from the cached event list with the ones from the tree query. """
+        for w in bin_sizes:
+            t0 = time()
+            b0 = self.get_tree_events(w, cut, _redo=True)[1]
+            t1 = time()
+            b1 = self.get_events(w, cut)[1]
+            t2 = time()
+            self.info(f'{w:>6} events: tree {t1 - t0:.3f} s, cached {(t2 - t1) * 1e3:.2f} ms, same edges: {array_equal(b0, b1)}')
+
     def get_raw(self, bin_width=None, start_event=0, end_event=None, vs_time=False, t_from_event=False):
         return self.get_raw_time(bin_width, start_event, end_event, t_from_event) if vs_time else self.get_raw_event(bin_width, start_event, end_event)
 
@@ -76,6 +97,11 @@ class Bins(SubAnalysis):
         end_event, bin_width = choose(end_event, self.NEvents), Bins.get_size(bin_width)
         return Bins.make(start_event, end_event, bin_width, last=end_event - 1 if end_event - start_event % bin_width > bin_width / 4 else None)
 
+    def get_fine_time(self):
+        """ :returns: fixed time bins of [FineTime] seconds covering the whole run """
+        n = int(ceil((self.Run.EndTime - self.Run.StartTime) / self.FineTime)) + 1
+        return [n, self.Run.StartTime + arange(n + 1) * self.FineTime]
+
     def get_raw_time(self, bin_width=None, start_time=0, end_time=None, t_from_event=False):
         """ returns bins with fixed time width. bin_width in seconds """
         if t_from_event:
@@ -185,10 +185,12 @@ class Cut(SubAnalysis):
 
     def update(self, name, value=None):
         self.CutStrings.set(name, value)
+        self.Run.EntryLists.clear()
 
     def remove(self, *name, ret=False):
         for cut in name:
             self.CutStrings.remove(cut)
+        self.Run.EntryLists.clear()
         return self if ret else self.Ana.Bins.remove_pickle()
 
     def set_chi2(self, value):
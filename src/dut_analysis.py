@@ -4,8 +4,8 @@
 # created on Oct 30th 2019 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
-from numpy import vectorize, meshgrid, digitize, histogram2d, lexsort, invert, any, unravel_index, argmax
-from numpy.random import rand
+from numpy import vectorize, meshgrid, digitize, histogram2d, lexsort, invert, any, unravel_index, argmax, array_equal, nanmax
+from numpy.random import rand, choice
 from uncertainties.umath import sqrt as usqrt  # noqa
 
 from src.currents import Currents
@@ -106,15 +106,13 @@ class DUTAnalysis(Analysis):
         self.save_data()
         self.save_plots(print_link)
 
-    def save_data(self, data=None):
+    def save_data(self, data=None, writer=None):
+        """ write the results into the shared hdf5 file. The rows are only buffered if a [writer] is given, which has to be flushed afterwards. """
         if self.Draw.mount_exists:
             data = choose(data, self.get_data())
-            with h5py.File(join(self.Draw.ServerMountDir, 'data', 'data.hdf5'), 'a') as f:
-                if self.TCString not in f:
-                    f.create_group(self.TCString)
-                if str(self.DUT.Number) not in f[self.TCString]:
-                    f[self.TCString].create_dataset(str(self.DUT.Number), data=zeros((self.Run.get_max_run() + 1, len(data), 2), 'd'))
-                f[self.TCString][str(self.DUT.Number)][self.Run.Number] = array([[v.n, v.s] for v in data], 'd')
+            w = choose(writer, H5Writer, file_path=join(self.Draw.ServerMountDir, 'data', 'data.hdf5'))
+            w.add(f'{self.TCString}/{self.DUT.Number}', self.Run.Number, [[v.n, v.s] for v in data], self.Run.get_max_run() + 1)
+            w.flush() if writer is None else do_nothing()
 
     @reload_tree
     @quiet
@@ -127,16 +125,27 @@ class DUTAnalysis(Analysis):
         self.draw_pulse_height(show=False)
         self.Draw.print_http('plots.html', force_print=print_link)
 
-    def save_tree(self, cut=None):
-        f = TFile('test.root', 'RECREATE')
+    def save_tree(self, cut=None, events=None, file_name='test.root', compression=None, basket_size=None, loop=False):
+        """ save the events passing [cut] or the given [events] (entry numbers or bool mask) into a new file.
+            :param compression: ROOT compression setting (algorithm * 100 + level), default of TFile if None
+            :param basket_size: basket size of all branches in bytes, default of the tree if None
+            :param loop: fill the events one by one in python """
+        events = self.get_events(cut) if events is None else array(events)
+        events = where(events)[0] if events.dtype == bool else events
+        f = TFile(file_name, 'RECREATE')
+        if compression is not None:
+            f.SetCompressionSettings(compression)
         t = self.Tree.CloneTree(0)
-        n = self.Tree.Draw('Entry$', self.Cut(cut), 'goff')
-        good_events = self.Run.get_tree_vec(n, dtype='i4')
-        self.PBar.start(n)
-        for i, ev in enumerate(good_events):
-            self.Tree.GetEntry(ev)
-            t.Fill()
-            self.PBar.update(i)
+        if basket_size is not None:
+            t.SetBasketSize('*', int(basket_size))
+        if loop:
+            self.PBar.start(events.size)
+            for i, ev in enumerate(events):
+                self.Tree.GetEntry(int(ev))
+                t.Fill()
+                self.PBar.update(i)
+        else:
+            copy_entries(self.Tree, t, events)
         f.cd()
         t.Write()
         macro = self.Run.RootFile.Get('region_information')
@@ -144,7 +153,22 @@ class DUTAnalysis(Analysis):
             macro.Write()
         f.Write()
         f.Close()
-        self.info('successfully saved tree with only cut events.')
+        self.info(f'successfully saved tree with {events.size} cut events.')
+
+    def compare_save_tree(self, cut=None, file_name='test.root'):
+        """ save the tree with both methods and check that the skimmed tree holds exactly the selected events. """
+        events, t = self.get_events(cut), []
+        for loop in [True, False]:
+            t0 = time()
+            self.save_tree(events=events, file_name=file_name, loop=loop)
+            t.append(time() - t0)
+        f = TFile(file_name)
+        tree = f.Get(self.Run.TreeName)
+        tree.SetEstimate(events.size)
+        same = array_equal(get_tree_vec(tree, 'event_number', dtype='i4'), self.get_tree_vec('event_number', dtype='i4')[events])
+        self.info(f'loop: {t[0]:.2f} s, bulk: {t[1]:.2f} s, same entries: {same}')
+        return same
+
     # endregion SAVE
     # ----------------------------------------
 
@@ -177,22 +201,49 @@ class DUTAnalysis(Analysis):
     def get_tree_vec(self, var, cut='', dtype=None, nentries=None, firstentry=0):
         return self.Run.get_tree_vec(var, cut, dtype, nentries, firstentry)
 
+    def iter_tree_vec(self, var, cut='', dtype=None, chunk=1e6):
+        return self.Run.iter_tree_vec(var, cut, dtype, chunk)
+
+    def reduce_tree_vec(self, var, reducers, cut='', dtype=None, chunk=1e6):
+        return self.Run.reduce_tree_vec(var, reducers, cut, dtype, chunk)
+
     def get_events(self, cut=None, redo=False):
         if type(cut) == str:
             return self.get_tree_vec('Entry$', cut, dtype='i4')
         cut = self.Cut(cut)
+        self.Run.set_estimate()
         return do_hdf5(self.make_simple_hdf5_path('', cut.GetName(), 'Events'), self.get_tree_vec, redo, dtype='i4', var='Entry$', cut=cut) if cut.GetTitle() else arange(self.Run.NEvents)
 
     def get_event_cut(self, cut=None, redo=False):
         return self.make_event_cut(self.get_events(cut, redo))
 
-    def set_event_cut(self, events):
-        """ selects the [events] in the TTree, undo with self.reset_entries()"""
+    def set_event_cut(self, events, name=None):
+        """ selects the [events] in the TTree, undo with self.reset_entries(). The entry list is kept in the run with the key [name], if given. """
+        if name is None or name not in self.Run.EntryLists:
+            elist = make_entry_list(events)
+            if name is None:
+                return self.Tree.SetEntryList(elist)
+            self.Run.EntryLists[name] = elist
+        self.Tree.SetEntryList(self.Run.EntryLists[name])
+
+    def set_cut_entries(self, cut=None):
+        cut = self.Cut(cut)
+        self.set_event_cut(self.get_events(cut), cut.GetTitle())  # key by the expression, string cuts are all named "CUT"
+
+    def compare_entry_lists(self, n=1e6):
+        """ fill [n] random events with the python loop and in bulk and check that the entries are the same. """
         from ROOT import TEntryList
-        elist = TEntryList()
-        for ev in array(events, 'i'):
-            elist.Enter(ev)
-        self.Tree.SetEntryList(elist)
+        events = choice(self.Run.NEvents, int(min(n, self.Run.NEvents)), replace=False).astype('i')
+        events.sort()
+        t0, e0 = time(), TEntryList()
+        for ev in events:
+            e0.Enter(int(ev))
+        t1 = time()
+        e1 = make_entry_list(events)
+        t2 = time()
+        same = e0.GetN() == e1.GetN() and all(e0.GetEntry(i) == e1.GetEntry(i) for i in range(e0.GetN()))
+        self.info(f'loop: {t1 - t0:.2f} s, bulk: {t2 - t1:.3f} s, same entries: {same}')
+        return same
 
     def reset_entries(self):
         """ reset the TEntryList from the TTree """
@@ -270,6 +321,47 @@ class DUTAnalysis(Analysis):
     def get_signal_var(self, *args, **kwargs):
         """ :returns: the pulse height variable in the tree + corrections. [str] """
 
+    @save_pickle('Fine', sub_dir='Trends', suf_args='[1, 2, 3]')
+    def get_fine_trend(self, var, name, y_range=None, cut=None, _redo=False):
+        """ :returns: profile of [var] in the fine time bins of the run, from which trends with coarser bins are summed without reading the tree again.
+            Values outside of [y_range] are excluded. [name] labels [var] in the file name, so it has to be unique for every var. """
+        return self.fill_trend(var, self.Bins.get_fine_time(), y_range, cut)
+
+    def fill_trend(self, var, bins, y_range=None, cut=None):
+        t, y = self.get_tree_vec([self.get_t_var(), var], self.Cut(cut))
+        c = ones(y.size, '?') if y_range is None else (y_range[0] < y) & (y < y_range[1])
+        return StreamProfile(bins).add(t[c], y[c])
+
+    def get_binned_trend(self, var, name, bins, y_range=None, cut=None, redo=False):
+        """ :returns: profile of [var] in the time [bins]. It is summed from the fine trend if the bins lie on the fine grid, otherwise it is filled from the tree. """
+        if on_grid(self.Bins.get_fine_time()[1], bins[1]):
+            return self.get_fine_trend(var, name, y_range, cut, _redo=redo).rebin(bins)
+        return self.fill_trend(var, bins, y_range, cut)
+
+    def get_time_trend(self, var, name, bw=None, y_range=None, cut=None, redo=False):
+        """ :returns: profile of [var] with the unique [name] in the time bins of [bw] events after [cut] """
+        return self.get_binned_trend(var, name, self.Bins.get_time(bw, cut), y_range, cut, redo)
+
+    def make_trend_graph(self, p, title='Trend', sigma=False, **dkw):
+        """ :returns: graph of the mean (or the standard deviation) in the non-empty bins of the profile [p] """
+        c = p.Counts > 0
+        return self.Draw.graph((p.Edges[:-1] + diff(p.Edges) / 2)[c], p.get_values(sigma)[c], title, **prep_kw(dkw, show=False))
+
+    def compare_trends(self, bw=(30, 60, 300), cut=None):
+        """ compare the trends in fixed time bins of [bw] seconds summed from the fine trend with the directly computed profiles. """
+        t, y = self.get_tree_vec([self.get_t_var(), self.get_signal_var()], self.Cut(cut))
+        fine = self.get_fine_trend(self.get_signal_var(), 'PH', cut=cut)
+        for w in bw:
+            e = self.Bins.get_fine_time()[1][::int(round(w / Bins.FineTime))]
+            t0 = time()
+            p0 = bin_stats(t, y, e)
+            t1 = time()
+            p1 = fine.rebin(e)
+            t2 = time()
+            with errstate(invalid='ignore'):
+                d = nanmax(abs(p0.mean - p1.mean))
+            self.info(f'{w:>4} s: direct {t1 - t0:.3f} s, rebinned {(t2 - t1) * 1e3:.2f} ms, same counts: {array_equal(p0.Counts, p1.Counts)}, max mean deviation: {d:.1e}')
+
     def get_split_ph(self, m=2):
         return hist_values_2d(self.split_signal_map(m, show=0)[0])
 
@@ -474,18 +566,52 @@ class DUTAnalysis(Analysis):
 
     # ----------------------------------------
     # region SIGNAL MAP
+    @save_pickle('Fine', sub_dir='Maps', suf_args='[1, 2, 3]')
+    def get_fine_map(self, var, cut=None, name=None, local=True, _redo=False):
+        """ :returns: sums of [var] on the fine grid of the track positions, from which maps with coarser bins, sub regions and projections are summed.
+            [name] labels [var] in the file name. """
+        self.Tree.SetEstimate(self.Run.NEvents)
+        x, y, zz = self.get_tree_vec(self.get_track_vars(local=local) + [var], self.Cut(cut))
+        return StreamProfile2D(Bins.get_global(Bins.FineRes)).add(x, y, zz)
+
+    def get_binned_map(self, var, bins, cut=None, name=None, local=True, redo=False):
+        """ :returns: profile of [var] in the [bins] of the track positions. It is summed from the fine map if the bins lie on the fine grid, otherwise it is filled from the tree. """
+        if all(on_grid(e, b) for e, b in zip(Bins.get_global(Bins.FineRes)[1::2], bins[1::2])):
+            return self.get_fine_map(var, cut, name, local, _redo=redo).rebin(bins)
+        self.Tree.SetEstimate(self.Run.NEvents)
+        x, y, zz = self.get_tree_vec(self.get_track_vars(local=local) + [var], self.Cut(cut))
+        return StreamProfile2D(bins).add(x, y, zz)
+
+    def get_binned_sm(self, bins, cut=None, fid=False, local=True, redo=False):
+        return self.get_binned_map(self.get_ph_var(), bins, self.Cut.generate_custom(exclude='fiducial', prnt=False) if not fid and cut is None else self.Cut(cut), 'PH', local, redo)
+
+    def get_map_bins(self, res=None, square=False, m=None, n=None):
+        return Bins.get_global(res, square) if m is None else self.get_fid_bins(m, n)
+
     @save_pickle('SMRange', sub_dir='Maps', suf_args='all')
     def find_sm_range(self, res=None, square=False, m=None, n=None, _redo=False):
-        var, b = self.get_track_vars() + [self.get_ph_var()],  Bins.get_global(res, square) if m is None else self.get_fid_bins(m, n)
-        return ax_range(hist_values_2d(self.Draw.prof2d(*self.get_tree_vec(var, self.Cut()), b, show=False)), thresh=4)
+        p = self.get_binned_sm(self.get_map_bins(res, square, m, n), fid=True, redo=_redo)
+        return ax_range(p.mean[p.Counts > 0], thresh=4)
 
     @save_pickle('SM', sub_dir='Maps', print_dur=True, suf_args='all')
     def get_signal_map(self, res=None, cut=None, fid=False, square=False, m=None, n=None, local=True, _redo=False):
-        self.Tree.SetEstimate(self.Run.NEvents)
-        var, b = self.get_track_vars(local=local) + [self.get_ph_var()], Bins.get_global(res, square) if m is None else self.get_fid_bins(m, n)
-        x, y, zz = self.get_tree_vec(var, self.Cut.generate_custom(exclude='fiducial', prnt=False) if not fid and cut is None else self.Cut(cut))
-        tit, ztit = 'Pulse Height Map', 'Pulse Height [mV]'
-        return self.Draw.prof2d(x, y, zz, b, tit, **self.Tracks.ax_tits(), z_tit=ztit, z_range=self.find_sm_range(res, square, m, n, _redo=_redo), show=False, pal=53)
+        h = self.get_binned_sm(self.get_map_bins(res, square, m, n), cut, fid, local, _redo).make_prof2d('Pulse Height Map')
+        return self.Draw.prof2d(h, **self.Tracks.ax_tits(), z_tit='Pulse Height [mV]', z_range=self.find_sm_range(res, square, m, n, _redo=_redo), show=False, pal=53)
+
+    def compare_maps(self, res=(2, 4, 8, 16), cut=None):
+        """ compare the regeneration of signal maps with [res] times the fine resolution from the tree and from the fine map. """
+        x, y, zz = self.get_tree_vec(self.get_track_vars() + [self.get_ph_var()], self.Cut(cut))
+        fine = self.get_fine_map(self.get_ph_var(), cut, 'PH')
+        for r in res:
+            b = Bins.get_global(r * Bins.FineRes)
+            t0 = time()
+            p0 = StreamProfile2D(b).add(x, y, zz)
+            t1 = time()
+            p1 = fine.rebin(b)
+            t2 = time()
+            with errstate(invalid='ignore'):
+                d = nanmax(abs(p0.mean - p1.mean))
+            self.info(f'{r:>2}x fine res: tree {t1 - t0:.3f} s, fine map {(t2 - t1) * 1e3:.1f} ms, same entries: {array_equal(p0.Counts, p1.Counts)}, max deviation: {d:.1e}')
 
     def draw_signal_map(self, res=None, cut=None, fid=False, square=False, m=None, n=None, local=True, scale=False, redo=False, **kwargs):
         h = self.get_signal_map(res, cut, fid, square, m, n, local=local, _redo=redo)
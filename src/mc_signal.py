@@ -3,11 +3,9 @@
 #       module to create MC signal distributions
 # created on January 12th 2021 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
-from numpy.random import normal, randint
-from numpy import concatenate, cumsum, linspace, where, polyfit, array, append, arange, invert, mean, round
-from ROOT import gRandom
+from numpy import concatenate, cumsum, array, append, arange, invert, mean, round, searchsorted, insert, diff
 from plotting.draw import Draw, choose, join, hist_xy, calc_eff, mean_sigma, ax_range, hist_values_2d, prep_kw
-from helpers.utils import get_base_dir, PBar, update_pbar
+from helpers.utils import get_base_dir, PBar, landau_sample, default_rng
 
 
 class MCSignal(object):
@@ -15,9 +13,10 @@ class MCSignal(object):
     Pedestal = 2
     Noise = 5
 
-    def __init__(self, ana=None, n=1e6):
+    def __init__(self, ana=None, n=1e6, seed=None):
 
         self.Ana = ana
+        self.RNG = default_rng(seed)
         self.HasAna = self.Ana is not None
         self.Draw = Draw(join(get_base_dir(), 'config', 'main.ini'))
         self.PBar = PBar()
@@ -34,30 +33,29 @@ class MCSignal(object):
         self.PBucket = ana.get_bucket_ratio().n and ana.Cut.has('bucket') if ana is not None and ana.Cut.has('bucket') else 0.05246
         self.NBuc = round(self.N * self.PBucket)
         self.NCons = None
+        self.SignalCDF = None
 
         # self.B1, self.B2 = self.gen_data()
         # self.BCut = invert((self.B2 > 2 * self.Noise) & (self.B1 < 2 * self.Noise))
 
     def gen_noise(self, n=None):
-        return normal(self.Pedestal, self.Noise, choose(n, self.N))
+        return self.RNG.normal(self.Pedestal, self.Noise, int(choose(n, self.N)))
 
     def gen_signal(self, n=None, w0=20, w1=20, m0=70, m1=85, p=.6, cons=False):
         if self.Ana is not None:
-            return MCSignal.gen_sig_from_dist(self.Ana.draw_signal_distribution(show=False, prnt=False, evnt_corr=False), n=n) * (1.025 if cons else 1)
-        g = concatenate([normal(choose(m, 80), choose(w, 20), round(choose(n, self.N) * ip)) for w, ip, m in [(w0, p, m0), (w1, 1 - p, m1)]])
-        return [gRandom.Landau(ig, ig / 8) for ig in g]  # assuming R=FWHM/MPV=.5, FWHM=4*width
+            return self.get_signal_cdf()(choose(n, self.N), self.RNG) * (1.025 if cons else 1)
+        g = concatenate([self.RNG.normal(choose(m, 80), choose(w, 20), int(round(choose(n, self.N) * ip))) for w, ip, m in [(w0, p, m0), (w1, 1 - p, m1)]])
+        return landau_sample(g, g / 8, rng=self.RNG)  # assuming R=FWHM/MPV=.5, FWHM=4*width
 
     @staticmethod
-    def gen_sig_from_dist(h, n=None, p_steps=100000):
-        """interpolate the cdf in equal prob steps and sample it"""
-        n = int(choose(n, 1e6))
-        x, y = hist_xy(h, err=False)
-        ints = cumsum(y) / h.GetEntries()
-        p = linspace(0, 1, p_steps, endpoint=False)
-        ip = array([where(ip >= ints)[0][-1] for ip in p])
-        fits = polyfit(x[:2], [ints[ip], ints[ip + 1]], deg=1)
-        xp = append((p - fits[1]) / fits[0] + (x[ip] - x[0] + (x[1] - x[0]) / 2), max(x))
-        return xp[randint(0, p.size, size=n)]
+    def gen_sig_from_dist(h, n=None, rng=None):
+        """interpolate the cdf linearly within the bins and sample it"""
+        return InvCDF.from_hist(h)(choose(n, 1e6), rng)
+
+    def get_signal_cdf(self):
+        if self.SignalCDF is None:
+            self.SignalCDF = InvCDF.from_hist(self.Ana.draw_signal_distribution(show=False, prnt=False, evnt_corr=False))
+        return self.SignalCDF
 
     def draw_signal_distribution(self, data=None, cut=...):
         x = choose(data, self.get_data()[0])[cut]
@@ -111,24 +109,43 @@ class MCSignal(object):
         lr = Draw.horizontal_line(1 if rel else real, w=2, color=3)
         self.Draw.legend([g, lr, lc], ['w/ cut', 'real signal', 'w/o cut'], ['f', 'l', 'l'])
 
-    @update_pbar
-    def _sim_signal(self, mpv, xi):
-        return gRandom.Landau(mpv, xi)
-
     def sim_signal(self, res=.5, n=1e6, noise=None):
         m, p = [hist_values_2d(f(res, cut=self.Ana.Cut(), show=False), err=False).astype(t) for f, t in [(self.Ana.draw_signal_map, 'd'), (self.Ana.draw_hitmap, 'i')]]
         m = m.repeat(array(round(p / sum(p) * n), 'i'))
-        self.PBar.start(int(m.size))
         mpv = -1.49e-01 + m * 7.35e-01 + m ** 2 * 5.77e-04
         xi = mpv * 0.067142
-        noise = normal(0, choose(noise, self.Ana.Pedestal.get_mean().n), xi.size)
-        ph = array([self._sim_signal(i, j) for i, j in array([mpv, xi]).T]) + noise
-        return ph
+        noise = self.RNG.normal(0, choose(noise, self.Ana.Pedestal.get_mean().n), xi.size)
+        return landau_sample(mpv, xi, rng=self.RNG) + noise
 
     def draw_sim(self, res=.5, n=1e6, noise=None, cut_off=410, **kwargs):
         x = self.sim_signal(res, n, noise)
         self.Draw.distribution(x[x < cut_off], self.Ana.Bins.get_pad_ph(2), x_tit='Pulse Height [mV]', **prep_kw(kwargs, y_off=1.65, lm=.15))
 
 
+class InvCDF(object):
+    """ prepared inverse cumulative distribution of a binned distribution. Only holds numpy arrays, so it can be reused and sent to worker processes. """
+
+    def __init__(self, x, y):
+        w = diff(x).mean() if x.size > 1 else 1
+        self.Edges = append(x - w / 2, x[-1] + w / 2)
+        self.CDF = insert(cumsum(y, dtype='d'), 0, 0)
+        self.CDF /= self.CDF[-1]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {self.Edges.size - 1} bins in [{self.Edges[0]:.1f}, {self.Edges[-1]:.1f}]'
+
+    def __call__(self, n=1, rng=None):
+        return self.get(default_rng(rng).random(int(n)))
+
+    @classmethod
+    def from_hist(cls, h):
+        return cls(*hist_xy(h, err=False))
+
+    def get(self, p):
+        """:returns: the values at the probabilities [p] """
+        i = (searchsorted(self.CDF, p, side='right') - 1).clip(0, self.CDF.size - 2)
+        return self.Edges[i] + (p - self.CDF[i]) / (self.CDF[i + 1] - self.CDF[i]) * (self.Edges[i + 1] - self.Edges[i])
+
+
 if __name__ == '__main__':
     z = MCSignal()
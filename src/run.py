@@ -34,6 +34,7 @@ class Run(Analysis):
         self.Info = self.load_run_info()
         self.RootFile = None
         self.Tree = TTree()
+        self.EntryLists = {}
         self.TreeName = self.Config.get('BASIC', 'treename')
         self.DUTs = [self.dut(i + 1, self.Info) for i in range(self.get_n_diamonds())] if self.Number is not None else None
 
@@ -393,6 +394,12 @@ class Run(Analysis):
     def get_tree_vec(self, var, cut='', dtype=None, nentries=None, firstentry=0):
         return get_tree_vec(self.Tree, var, cut, dtype, nentries, firstentry)
 
+    def iter_tree_vec(self, var, cut='', dtype=None, chunk=1e6):
+        return iter_tree_vec(self.Tree, var, cut, dtype, chunk)
+
+    def reduce_tree_vec(self, var, reducers, cut='', dtype=None, chunk=1e6):
+        return reduce_tree_vec(self.Tree, var, reducers, cut, dtype, chunk)
+
     def get_tree_tuple(self):
         return (self.Tree, self.RootFile) if self.Tree is not None else False
 
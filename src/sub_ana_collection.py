@@ -3,7 +3,7 @@
 # created on Nov 14th 2020 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
-from src.analysis import Analysis, choose, do_nothing, array, file_exists
+from src.analysis import Analysis, choose, do_nothing, array, file_exists, load_pickle, Pool, cpu_count, partial
 
 
 class SubCollection(Analysis):
@@ -52,17 +52,45 @@ class SubCollection(Analysis):
     def get_runs(self):
         return self.Ana.get_runs()
 
-    def get_values(self, string, f, runs=None, pbar=None, avrg=False, picklepath=None, flux_sort=False, plots=False, *args, **kwargs):
+    def get_values(self, string, f, runs=None, pbar=None, avrg=False, picklepath=None, flux_sort=False, plots=False, *args, parallel=False, **kwargs):
         runs = choose(runs, self.Ana.Runs)
-        pbar = choose(pbar, 'redo' in kwargs and kwargs['redo'] or (True if picklepath is None else not all(file_exists(picklepath.format(run)) for run in runs)))
-        values = []
+        redo = kwargs.get('redo', False) or kwargs.get('_redo', False)
+        pbar = choose(pbar, redo or (True if picklepath is None else not all(file_exists(picklepath.format(run)) for run in runs)))
         self.info('Generating {} ...'.format(string), prnt=pbar)
-        self.PBar.start(len(runs)) if pbar else do_nothing()
-        for ana in self.get_analyses(runs):
-            values.append(f(ana, *args, **kwargs))
-            self.PBar.update() if pbar else do_nothing()
+        if parallel:
+            values = self.get_parallel_values(f, runs, pbar, picklepath, *args, **kwargs)
+        else:
+            values = []
+            self.PBar.start(len(runs)) if pbar else do_nothing()
+            for ana in self.Ana.prefetch(self.get_analyses(runs)):
+                values.append(f(ana, *args, **kwargs))
+                self.PBar.update() if pbar else do_nothing()
         return values if plots else array(self.Ana.get_flux_average(array(values))) if avrg else array(values, dtype=object)[self.get_fluxes().argsort() if flux_sort else ...]
 
+    def get_parallel_values(self, f, runs, pbar=True, picklepath=None, *args, **kwargs):
+        """ load the values of the runs with cached [picklepath] directly and only evaluate the remaining runs in a process pool.
+            The cached pickles are returned as the values of [f], so [f] has to be decorated with :func:`save_pickle` writing exactly to [picklepath]. """
+        anas, redo = self.get_analyses(runs), kwargs.get('redo', False) or kwargs.get('_redo', False)
+        if picklepath is None or not hasattr(f, 'pickle_path') or f.pickle_path(anas[0], *args, **kwargs) != picklepath.format(anas[0].Run.Number):
+            raise ValueError(f'{f.__qualname__} does not cache its value at {picklepath}, cannot evaluate it in parallel')
+        cached = [] if redo else [i for i, ana in enumerate(anas) if file_exists(picklepath.format(ana.Run.Number))]
+        values = [load_pickle(picklepath.format(ana.Run.Number)) if i in cached else None for i, ana in enumerate(anas)]
+        cold = [i for i in range(len(anas)) if i not in cached]
+        self.PBar.start(len(anas)) if pbar else do_nothing()
+        for _ in cached:
+            self.PBar.update() if pbar else do_nothing()
+        if cold:
+            with Pool(min(len(cold), cpu_count())) as pool:
+                for i, value in zip(cold, pool.imap(partial(self.prep_f, f=f, args=args, kwargs=kwargs), [anas[i] for i in cold])):
+                    values[i] = value
+                    self.PBar.update() if pbar else do_nothing()
+        return values
+
+    @staticmethod
+    def prep_f(ana, f, args, kwargs):
+        ana.reload_tree_()
+        return f(ana, *args, **kwargs)
+
     def get_plots(self, string, f, runs=None, pbar=None, avrg=False, picklepath=None, *args, **kwargs):
         return self.get_values(string, f, runs, pbar, avrg, picklepath, False, True, *args, **kwargs)
 
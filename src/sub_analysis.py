@@ -33,6 +33,12 @@ class SubAnalysis(Analysis):
     def get_tree_vec(self, var, cut='', dtype=None, nentries=None, firstentry=0):
         return self.Run.get_tree_vec(var, cut, dtype, nentries, firstentry)
 
+    def iter_tree_vec(self, var, cut='', dtype=None, chunk=1e6):
+        return self.Run.iter_tree_vec(var, cut, dtype, chunk)
+
+    def reduce_tree_vec(self, var, reducers, cut='', dtype=None, chunk=1e6):
+        return self.Run.reduce_tree_vec(var, reducers, cut, dtype, chunk)
+
     def has_branch(self, branch):
         return self.Run.has_branch(branch)
 
@@ -3,12 +3,12 @@
 #       analysis class for the telescope
 # revised on Oct 4th 2020 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
-from ROOT import TCut, TF2
-from numpy import delete, prod, insert, split, cumsum
+from ROOT import TCut, TF2, TProfile
+from numpy import delete, prod, insert, split, cumsum, ones
 from uncertainties.umath import log as ulog  # noqa
 from src.binning import Bins
 from plotting.draw import *
-from helpers.utils import save_pickle, remove_files, time_stamp
+from helpers.utils import save_pickle, remove_files, time_stamp, save_result, glob
 from src.sub_analysis import SubAnalysis, choose
 from src.dut import Plane
 
@@ -85,7 +85,9 @@ class Telescope(SubAnalysis):
         flux = self.calculate_flux(plane, use_eff, _redo) if self.Tree.Hash and self.has_branch('rate') else self.Run.get_flux(plane, use_eff)
         if flux == 0:
             warning('Could not determine flux from TU rates ...')
-            remove_files(self.make_simple_pickle_path('Flux', suf='*'), prnt=False, wildcard=True)
+            files = glob(self.make_simple_pickle_path('Flux', suf='*'))
+            remove_files(files, prnt=False)
+            self.CacheIndex.remove(files)
             flux = self.Run.get_flux(plane, use_eff)
         return flux * (self.get_flux_scale(full_size, _redo=_redo) if corr else ufloat(1, .1))
 
@@ -128,7 +130,7 @@ class Telescope(SubAnalysis):
     def get_areas(self):
         return [self.get_area(pl) for pl in [1, 2]]
 
-    @save_pickle('PlaneFlux', suf_args='[0, 1]')
+    @save_result('PlaneFlux', suf_args='[0, 1]')
     def calculate_flux_(self, plane, corr, show=False, _redo=False):
         h = self.draw_rate_disto(plane, show=show)
         if h is None or h.GetEntries() < 3:
@@ -146,12 +148,15 @@ class Telescope(SubAnalysis):
 
     def draw_flux(self, bw=5, cut='', rel_time=True, show=True, prnt=True, save=True):
         cut = TCut('beam_current < 10000 && rate[{0}] < 1e9 && rate[{1}] < 1e9 && rate[{0}] && rate[{1}]'.format(*self.Run.TriggerPlanes + 1)) + TCut(cut)
+        p = TProfile('pflux', 'Flux Profile', *self.Bins.get_raw_time(bin_width=bw))
         if self.has_branch('rate'):
-            flux1, flux2, t = self.get_tree_vec(var=[self.get_flux_var(p) for p in [1, 2]] + [self.get_t_var()], cut=cut)
-            flux = mean([flux1, flux2], axis=0)[1:] / 1000
+            for i, (flux1, flux2, t) in enumerate(self.iter_tree_vec(var=[self.get_flux_var(pl) for pl in [1, 2]] + [self.get_t_var()], cut=cut)):
+                t, flux = t[int(i == 0):], mean([flux1, flux2], axis=0)[int(i == 0):] / 1000  # skip the first event
+                p.FillN(t.size, t.astype('d'), flux.astype('d'), ones(t.size))
         else:
-            t, flux = self.Run.Time / 1000, full(self.Run.NEvents - 1, self.get_flux().n)
-        p = self.Draw.profile(t[1:], flux, self.Bins.get_raw_time(bin_width=bw), 'Flux Profile', draw_opt='hist', **Draw.mode(2), show=show)
+            t = self.Run.Time[1:] / 1000
+            p.FillN(t.size, t.astype('d'), full(t.size, self.get_flux().n), ones(t.size))
+        self.Draw(p, draw_opt='hist', **Draw.mode(2), show=show)
         format_histo(p, x_tit='Time [hh:mm]', y_tit='Flux [kHz/cm^{2}]', markersize=1, t_ax_off=self.StartTime if rel_time else 0, stats=0, y_range=[0, p.GetMaximum() * 1.2])
         self.Draw.save_plots('FluxProfile', prnt=prnt, show=show, save=save)
         return p
@@ -5,15 +5,15 @@
 # --------------------------------------------------------
 
 from ROOT import TCut, TF1, TMultiGraph, TMath
-from numpy import log, genfromtxt, rad2deg, polyfit, polyval, tan, delete, deg2rad, cumsum
-from scipy.stats import norm
+from numpy import log, genfromtxt, rad2deg, polyfit, polyval, tan, delete, deg2rad, cumsum, ones, zeros, cos, sin
+from numpy.linalg import inv
 
-from helpers.utils import arctan, save_pickle, update_pbar, quiet, PBAR
+from helpers.utils import arctan, save_pickle, update_pbar, quiet, PBAR, default_rng
 from plotting.draw import *
 from plotting.fit import Gauss
 from src.dut import Plane
 from src.sub_analysis import SubAnalysis
-from functools import partial
+from functools import partial, lru_cache
 
 
 class Tracks(SubAnalysis):
@@ -303,9 +303,44 @@ class Tracks(SubAnalysis):
         dx, dy, da = None, None, None
         for _ in range(steps + 1):
             dx, dy = self.calc_residual_step(x, y, z_positions)
-            da = self.align(x, y, dx, dy)
+            tx, ty, da = self.calc_alignment(x, y, dx, dy)
+            x[:], y[:] = self.apply_alignment(x, y, tx, ty, da)
         return dx, dy, da
 
+    def find_alignment(self, local=True, max_steps=50, tol=1e-6):
+        """ :returns: translation in x and y [mm] and rotation [rad] of every telescope plane, which minimise the track residuals. """
+        x, y = self.get_plane_hits(local).transpose(0, 2, 1)  # -> (n planes, n events)
+        return self.align_planes(x.astype('d'), y.astype('d'), self.get_z_positions()[:self.Run.NTelPlanes], max_steps, tol)[2:]
+
+    @staticmethod
+    def align_planes(x, y, z_positions, max_steps=50, tol=1e-6):
+        """ iterate track fits and closed-form alignment until all corrections are smaller than [tol].
+            :returns: aligned x and y, total translations (2, n planes) and rotations (n planes) """
+        t, a = zeros((2, x.shape[0])), zeros(x.shape[0])
+        for _ in range(max_steps):
+            dx, dy = Tracks.calc_residual_step(x, y, z_positions)
+            tx, ty, da = Tracks.calc_alignment(x, y, dx, dy)
+            x, y = Tracks.apply_alignment(x, y, tx, ty, da)
+            t, a = array(Tracks.apply_alignment(*t, tx, ty, da)), a + da  # R2 (R1 p + t1) + t2
+            if max(abs(tx).max(), abs(ty).max(), abs(da).max()) < tol:
+                break
+        return x, y, t, a
+
+    @staticmethod
+    def calc_alignment(x, y, dx, dy, w=None):
+        """ weighted least squares of the translation and rotation of every plane, that moves the hits [x], [y] with shape (n planes, n events) by the residuals [dx], [dy].
+            :returns: translations in x and y and rotation angles for every plane """
+        w = ones(x.shape) if w is None else w
+        m = [(w * v).sum(axis=1) / w.sum(axis=1) for v in [x, y, dx, dy]]
+        xc, yc, dxc, dyc = [v - iv.reshape(-1, 1) for v, iv in zip([x, y, dx, dy], m)]
+        a = arctan((w * (xc * dyc - yc * dxc)).sum(axis=1) / (w * (xc ** 2 + yc ** 2)).sum(axis=1))
+        return m[0] + m[2] - (cos(a) * m[0] - sin(a) * m[1]), m[1] + m[3] - (sin(a) * m[0] + cos(a) * m[1]), a
+
+    @staticmethod
+    def apply_alignment(x, y, tx, ty, a):
+        c, s, tx, ty = [v.reshape(-1, 1) if x.ndim > 1 else v for v in [cos(a), sin(a), tx, ty]]
+        return c * x - s * y + tx, s * x + c * y + ty
+
     @staticmethod
     def calc_residual_step(x, y, z_positions):
         x_fits, y_fits = [polyfit(z_positions, vec, 1) for vec in [x, y]]
@@ -367,22 +402,31 @@ class Tracks(SubAnalysis):
 
     # ----------------------------------------
     # region RESOLUTION
-    def draw_resolution(self, mode='x', cut='', n=1e5, unbias=False, redo=False, **dkw):
+    def draw_resolution(self, mode='x', cut='', n=None, unbias=False, redo=False, **dkw):
         z_ = self.get_z_positions()[:self.Run.NTelPlanes]
         r = uarr2n(self.get_residuals(mode=mode, cut=cut, unbias=unbias, redo=redo))
         x_range = -20, max(z_) + 20
         self.Draw.graph(z_, [ufloat(0, ex) for ex in r], **prep_kw(dkw, x_tit='z [mm]', y_tit='{} [#mum]'.format(mode.lower()), y_range=[-195, 195], x_range=x_range))
-        x = array([norm.rvs(0, ir, size=int(n)) for ir in r])
-        fits = array(polyfit(z_, x, deg=1))
         p = linspace(*x_range, 100)
-        z0 = polyval(fits, p.reshape(p.size, 1))
-        ex = array([ufloat(m, s) for m, s in [mean_sigma(iz, err=False) for iz in z0]])
-        g = self.Draw.make_tgraph(p, ex, fill_color=634, opacity=.5)
+        ex = self.calc_resolution(tuple(z_), tuple(r), tuple(append(p, mean(z_))), n)
+        g = self.Draw.make_tgraph(p, array([ufloat(0, e) for e in ex[:-1]]), fill_color=634, opacity=.5)
         g.Draw('e3')
-        xm, ym = mean(z_), mean_sigma(polyval(fits, mean(z_)))[1].n
+        xm, ym = mean(z_), ex[-1]
         Draw.arrow(xm, xm, -ym, ym, width=2, opt='<|>', size=.02)
         Draw.tlatex(xm, ym + 10, f'{ym:2.0f}#kern[.1]{{#mum}}', align=21)
-        return min(e.s for e in ex)
+        return min(ex[:-1])
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def calc_resolution(z, r, p, n=None):
+        """ propagate the plane resolutions [r] at the positions [z] to the straight track fit at the positions [p]. Arguments are tuples, so the results can be cached.
+            :returns: track uncertainty at [p], calculated analytically or with [n] random tracks as cross-check """
+        z, r, p = array(z, 'd'), array(r, 'd'), array(p, 'd')
+        a = array([z, ones(z.size)]).T
+        c = array([p, ones(p.size)]).T @ inv(a.T @ a) @ a.T  # the fit values are linear in the hits: x(p) = c @ x
+        if n is None:
+            return sqrt((c ** 2) @ r ** 2)
+        return (c @ default_rng().normal(0, r.reshape(-1, 1), (r.size, int(n)))).std(axis=1)
 
     @quiet
     def draw_resolution_vs_chi2(self, m=0, s=10, **dkw):